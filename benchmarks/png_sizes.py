@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""这个脚本比较 PNG 输出的各种压缩设置，为每种设置打印输出的字节数
+和编码一个二维码所用的时间，这样可以为每种用途选择合适的设置。
+
+用法::
+
+    python benchmarks/png_sizes.py [内容] [--scale 5] [--repeat 20]
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import io
+import itertools
+import timeit
+import pyqrcode
+
+#: The settings that are compared, the first one is the default output.
+_SETTINGS = [dict(compression=compression, strategy=strategy,
+                  row_filter=row_filter, optimize=optimize)
+             for optimize, compression, strategy, row_filter in
+             itertools.product((False, True), (None, 1, 9),
+                               (None, 'filtered', 'rle', 'fixed'),
+                               (None, 'up', 'adaptive'))]
+
+
+def _describe(setting):
+    return ' '.join('{0}={1}'.format(name, setting[name])
+                    for name in ('compression', 'strategy', 'row_filter',
+                                 'optimize'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PNG size benchmark')
+    parser.add_argument('content', nargs='?',
+                        default='https://example.com/pay?id=0123456789')
+    parser.add_argument('--scale', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--module-color', default='#000')
+    parser.add_argument('--background', default='#fff')
+    args = parser.parse_args()
+
+    qr = pyqrcode.create(args.content)
+    # Build the matrix before timing the encoder
+    qr.code
+    background = None if args.background == 'none' else args.background
+
+    results = []
+    for setting in _SETTINGS:
+        def render():
+            out = io.BytesIO()
+            pyqrcode.builder._png(qr.code, qr.version, out, args.scale,
+                                  args.module_color, background, **setting)
+            return out.getvalue()
+        size = len(render())
+        seconds = min(timeit.repeat(render, number=1, repeat=args.repeat))
+        results.append((size, seconds, setting))
+
+    default_size = results[0][0]
+    print('{0:>7} {1:>7} {2:>9}  {3}'.format('bytes', 'ratio', 'ms',
+                                              'setting'))
+    for size, seconds, setting in sorted(results, key=lambda r: r[:2]):
+        print('{0:>7} {1:>7.3f} {2:>9.3f}  {3}'.format(
+            size, size / default_size, seconds * 1000, _describe(setting)))
+
+
+if __name__ == '__main__':
+    main()
@@ -45,13 +45,29 @@ from __future__ import absolute_import, division, print_function, with_statement
 
 import pyqrcode.tables
 import pyqrcode.builder as builder
+import pyqrcode.reedsolomon as reedsolomon
+import hashlib
+import io
+import itertools
+import sys
 
 try:
     str = unicode  # Python 2
 except NameError:
     pass
 
-def create(content, error='H', version=None, mode=None, encoding=None):
+_PY2 = sys.version_info[0] == 2
+
+#: The types of contents that are bytes.
+_byte_types = (bytes, bytearray, memoryview)
+
+#: The cache of built matrices used by every QRCode, None disables it.
+#: Assign a :class:`pyqrcode.cache.MatrixCache` to enable it.
+matrix_cache = None
+
+
+def create(content, error='H', version=None, mode=None, encoding=None,
+           scoring=None, mask=None):
     """当建立一个二维码时，只有内容是需要进行编码的，
     其他所有二维码的财产项会根据内容来进行选择适合的财产值。
     这个函数会返回一个 :class:`QRCode` 类的实例对象。
@@ -92,20 +108,132 @@ def create(content, error='H', version=None, mode=None, encoding=None):
     文档了解完整的可用字符清单。
     第三种 'kanji' 是用来编码日语片假名的。
     第四种 'binary' 是直接把字节编码到二维码里（这种编码模式是最没有效率的）。
+    另外还可以描述 'mixed' 混合模式，这不会自动选择，需要明确描述。
+    内容会分成多个数据段，每个数据段使用让整个二维码比特数最少的模式，
+    例如网址中的长数字可以用数字模式编码，其余部分用8比特模式编码。
+    分好的数据段保存在 `segments` 属性中，是一个 (模式, 数据) 元组的列表。
 
     其中 *encoding* 参数是描述如何解释二维码内容的。
     本参数只在乎 *content* 参数值是字符串、 unicode、或字节阵列数据类型。
     参数值必须是一种合法的编码字符串，或是 `None` 值。
     这会代入到 *content* 内容参数值的 `encode` 和 `decode` 方法中。
+
+    其中 *scoring* 参数描述选择遮罩时计算惩罚分所用的后端。
+    可以是 'python' 纯 Python 实现，或者是 'numpy' 需要安装 NumPy 模块。
+    默认值是 `builder.default_scoring` 变量的值。
+    没有安装 NumPy 时会退回到 'python' 后端，
+    实际使用的后端可以从 `builder.scoring` 属性中得知。
+    两个后端选择的遮罩总是一样的。
+
+    其中 *mask* 参数描述如何选择二维码的遮罩。
+    默认值 'exhaustive' 会计算所有8种遮罩的惩罚分。
+    'bound' 选择一样的遮罩，但会跳过已经不可能最好的遮罩的剩余计算。
+    一个0到7的整数会直接使用该遮罩，完全不计算惩罚分。
+    也可以是一个可调用对象，它的参数是 :class:`builder.QRCodeBuilder`
+    实例，返回遮罩的索引位。
+    """
+    return QRCode(content, error, version, mode, encoding, scoring, mask)
+
+
+def create_many(contents, error='H', version=None, mode=None, encoding=None,
+                scoring=None, mask=None, matrices=False):
+    """这个函数为 *contents* 参数中的每个内容建立一个二维码，
+    是一个生成器，按顺序一个一个地产生 :class:`QRCode` 类的实例对象。
+    *contents* 参数可以是任何可迭代对象，包括另一个生成器，
+    内容只在需要时才读取，不会先建立一个列表。
+
+    其它参数与 :func:`pyqrcode.create` 函数一样，对所有二维码都有效。
+    参数只在调用本函数时检查一次，不合法的参数会在读取第一个内容之前
+    就引发 `ValueError` 异常。每个版本的模板、数据位置、遮罩位图和数据块
+    布局都在模块中缓存，整批二维码都共享它们。
+
+    如果 *matrices* 参数是 `True` ，生成器会产生每个二维码的
+    :class:`builder.Matrix` 矩阵，而不是 :class:`QRCode` 对象，
+    建立二维码所用的对象不会一直保留在内存中。
+    如果同时使用 `scoring='numpy'` 参数，并且安装了 NumPy ，
+    内容会每次读取1024个，同样版本号的二维码用 NumPy 一起建立，
+    这对大批量同样大小的二维码快得多，矩阵与逐个建立的完全一样。
+
+    Example:
+        >>> labels = ('SN-{0:08d}'.format(n) for n in range(1000))
+        >>> for code in pyqrcode.create_many(labels, error='M'):
+        ...     code.svg(code.data.decode('ascii') + '.svg')
     """
-    return QRCode(content, error, version, mode, encoding)
+    #Check the options once for the whole batch
+    if error not in tables.error_level:
+        raise ValueError('{0} is not a valid error '
+                         'level.'.format(error))
+    error = tables.error_level[error]
+
+    if version is not None and not 1 <= version <= 40:
+        raise ValueError("Illegal version {0}, version must be between "
+                         "1 and 40.".format(version))
+
+    if hasattr(mode, 'lower'):
+        mode = mode.lower()
+    if mode is not None and mode != 'mixed' and mode not in tables.modes:
+        raise ValueError('{0} is not a valid mode.'.format(mode))
+
+    scoring = builder._get_scoring(scoring)
+    mask = builder._get_mask_strategy(mask)
+
+    return _create_many(contents, error, version, mode, encoding, scoring,
+                        mask, matrices)
+
+
+def _create_many(contents, error, version, mode, encoding, scoring, mask,
+                 matrices):
+    """这是 :func:`create_many` 函数的生成器，参数都已经检查过了。"""
+    #Matrices scored with NumPy are built together, a chunk at a time
+    if matrices and scoring == 'numpy' and not callable(mask):
+        contents = iter(contents)
+        chunk = list(itertools.islice(contents, _numpy_chunk_size))
+        while chunk:
+            codes = [QRCode(content, error, version, mode, encoding,
+                            scoring, mask) for content in chunk]
+            for code in _build_many(codes, mask):
+                yield code
+            chunk = list(itertools.islice(contents, _numpy_chunk_size))
+        return
+
+    for content in contents:
+        qr = QRCode(content, error, version, mode, encoding, scoring, mask)
+        if matrices:
+            yield qr.code
+        else:
+            yield qr
+
+
+#: The number of contents create_many builds at once with NumPy.
+_numpy_chunk_size = 1024
 
-class QRCode:
+
+def _build_many(codes, mask):
+    """这个函数用 :func:`builder._build_many_numpy` 函数建立 *codes* 参数中
+    所有 :class:`QRCode` 对象的二维码，每个版本号的二维码一起建立，
+    然后按照原来的顺序返回所有矩阵的列表。
+    """
+    versions = {}
+    for n, qr in enumerate(codes):
+        versions.setdefault(qr.version, []).append(n)
+
+    matrices = [None] * len(codes)
+    for version, indexes in versions.items():
+        data = [(codes[n]._get_builder_data(), codes[n].mode)
+                for n in indexes]
+        built = builder._build_many_numpy(data, version, codes[0].error,
+                                          mask)
+        for n, matrix in zip(indexes, built):
+            matrices[n] = matrix
+    return matrices
+
+
+class QRCode(object):
     """这个类是用来表示一个二维码用的。
     要使用这个类，直接在构造器中给出一个字符串形式的数据来完成编码工作，
     这个类然后会在内存中建立一个二维码。接着你可以保存成不同的格式文件。
-    注意，二维码可以写成 PNG 图片文件，但需要安装 `pypng` 模块。
-    你可以在 PyPNG 模块主页找到它 http://packages.python.org/pypng/
+    注意，二维码可以写成 PNG 图片文件，PNG 文件是用标准库的 `zlib`
+    模块写出来的，不需要安装其它模块。
 
     Examples:
         >>> from pyqrcode import QRCode
@@ -119,9 +247,20 @@ class QRCode:
     .. note::
         对于类初始化中的参数能做什么，阅读 :func:`pyqrcode.create`
         函数的文档字符串。
+
+    建立实例时只会确定二维码的模式、版本号、比特数和数据块布局，
+    这些计算量都很小。二维码矩阵要等到第一次访问 `code` 属性，
+    或者第一次输出二维码时才会建立。
     """
+    #: The byte contents encoded as they are in binary mode, see data.
+    _payload = None
+
+    #: The matrix and its digest, set the first time they are used.
+    _code = None
+    _digest = None
+
     def __init__(self, content, error='H', version=None, mode=None,
-                 encoding='iso-8859-1'):
+                 encoding='iso-8859-1', scoring=None, mask=None):
         #Guess the mode of the code, this will also be used for
         #error checking
         guessed_content_type, encoding = self._detect_content_type(content, encoding)
@@ -142,8 +281,33 @@ class QRCode:
                 raise ValueError("Illegal version {0}, version must be between "
                                  "1 and 40.".format(version))
 
+        #Force a passed in mode to be lowercase
+        if hasattr(mode, 'lower'):
+            mode = mode.lower()
+
+        #Mixed codes are split into segments as text, the encoding is only
+        #used for the binary segments
+        if mode == 'mixed':
+            self.encoding = encoding
+            if isinstance(content, bytes):
+                self.data = content.decode(encoding)
+            elif hasattr(content, 'encode'):
+                self.data = content
+            else:
+                self.data = str(content)
+
+        #Binary byte contents are encoded exactly as they are, they are
+        #only decoded when the data attribute is used. Mutable buffers are
+        #copied, on Python 2 bytes(memoryview) would be its repr
+        elif isinstance(content, _byte_types) and \
+             'binary' in (guessed_content_type, mode):
+            if isinstance(content, memoryview):
+                content = content.tobytes()
+            self._payload = bytes(content)
+            self._data = None
+
         #Decode a 'byte array' contents into a string format
-        if isinstance(content, bytes):
+        elif isinstance(content, bytes):
             self.data = content.decode(encoding)
 
         #Give a string an encoding
@@ -155,15 +319,15 @@ class QRCode:
         else:
             self.data = str(content)  # str == unicode in Py 2.x, see file head
 
-        #Force a passed in mode to be lowercase
-        if hasattr(mode, 'lower'):
-            mode = mode.lower()
-
         #Check that the mode parameter is compatible with the contents
         if mode is None:
             #Use the guessed mode
             self.mode = guessed_content_type
             self.mode_num = tables.modes[self.mode]
+        elif mode == 'mixed':
+            #Every segment gets its own mode
+            self.mode = mode
+            self.mode_num = None
         elif mode not in tables.modes.keys():
             #Unknown mode
             raise ValueError('{0} is not a valid mode.'.format(mode))
@@ -194,13 +358,28 @@ class QRCode:
             raise ValueError('{0} is not a valid error '
                              'level.'.format(error))
 
-        #Guess the "best" version
-        self.version = self._pick_best_fit(self.data)
+        #Guess the "best" version, a mixed code is split into the segments
+        #that need the fewest bits
+        if self.mode == 'mixed':
+            self.version, self.segments = builder._pick_segments(
+                self.data, self.error, self.encoding)
+        else:
+            if self._payload is not None:
+                data = self._payload
+            else:
+                data = self.data
+            self.version = self._pick_best_fit(data)
+            self.segments = [(self.mode, data)]
 
         #If the user supplied a version, then check that it has
         #sufficient data capacity for the contents passed in
         if version:
             if version >= self.version:
+                #The data length fields, and so the best segments,
+                #depend on the version
+                if self.mode == 'mixed' and version != self.version:
+                    self.segments = builder._pick_segments(
+                        self.data, self.error, self.encoding, version)[1]
                 self.version = version
             else:
                 raise ValueError('The data will not fit inside a version {} '
@@ -208,14 +387,200 @@ class QRCode:
                                  'level (the code must be at least a '
                                  'version {}).'.format(version, self.version))
 
-        #Build the QR code
-        self.builder = builder.QRCodeBuilder(data=self.data,
-                                             version=self.version,
-                                             mode=self.mode,
-                                             error=self.error)
+        #Check the build options now, the code itself is built the first
+        #time it is needed
+        self._scoring = builder._get_scoring(scoring)
+        self._mask = builder._get_mask_strategy(mask)
+        self._builder = None
+
+    @classmethod
+    def from_segments(cls, segments, error='H', version=None, scoring=None,
+                      mask=None):
+        """这个类方法用描述好的数据段建立一个 'mixed' 模式的二维码。
+        其中 *segments* 参数是一个 (模式, 数据) 元组的列表，
+        模式是 `tables.modes` 中的一种模式名称。
+        'numeric' 和 'alphanumeric' 模式的数据是字符串，
+        'binary' 模式的数据是字节，'kanji' 模式的数据是 Shift JIS 字节，
+        这两种模式的字符串数据会分别用 ISO-8859-1 和 Shift JIS 编码成字节。
+
+        数据段会直接编码，不会检测内容类型，也不会检查数据能否用该模式编码，
+        所以数据必须是正确的。当你已经知道数据的结构时，
+        例如一个固定的字母数字组合前缀加上一个数字序列号，
+        这比 :func:`pyqrcode.create` 函数要快。
+        其它参数与 :func:`pyqrcode.create` 函数一样。
+
+        Example:
+            >>> qr = QRCode.from_segments([('alphanumeric', 'SN-'),
+            ...                            ('numeric', '0123456789')])
+        """
+        qr = cls.__new__(cls)
+
+        #Check that the user passed in a valid error level
+        if error in tables.error_level:
+            qr.error = tables.error_level[error]
+        else:
+            raise ValueError('{0} is not a valid error '
+                             'level.'.format(error))
 
-        #Save the code for easier reference
-        self.code = self.builder.code
+        qr.segments = []
+        for mode, data in segments:
+            if mode not in tables.modes:
+                raise ValueError('{0} is not a valid mode.'.format(mode))
+
+            #The binary and kanji encoders count bytes
+            if mode == 'binary' and not isinstance(data, bytes):
+                data = data.encode('iso-8859-1')
+            elif mode == 'kanji' and not isinstance(data, bytes):
+                data = data.encode('shiftjis')
+            qr.segments.append((mode, data))
+
+        qr.data = qr.segments
+        qr.mode = 'mixed'
+        qr.mode_num = None
+        qr.encoding = None
+
+        qr.version = builder._pick_segments_version(qr.segments, qr.error)
+        if version is not None and version != qr.version:
+            if not 1 <= version <= 40:
+                raise ValueError("Illegal version {0}, version must be "
+                                 "between 1 and 40.".format(version))
+            if version < qr.version:
+                raise ValueError('The data will not fit inside a version {} '
+                                 'code with the given error level (the code '
+                                 'must be at least a version '
+                                 '{}).'.format(version, qr.version))
+            #The data length fields of a larger version may be wider
+            if builder._fit_segments(qr.segments, qr.error,
+                                     version, version) is None:
+                raise ValueError('The data will not fit inside a version {} '
+                                 'code with the given error '
+                                 'level.'.format(version))
+            qr.version = version
+
+        qr._scoring = builder._get_scoring(scoring)
+        qr._mask = builder._get_mask_strategy(mask)
+        qr._builder = None
+        return qr
+
+    @property
+    def builder(self):
+        """建立这个二维码的 :class:`builder.QRCodeBuilder` 实例。
+        第一次访问这个属性时才会建立二维码。
+        """
+        if self._builder is None:
+            data = self._get_builder_data()
+            self._builder = builder.QRCodeBuilder(data=data,
+                                                  version=self.version,
+                                                  mode=self.mode,
+                                                  error=self.error,
+                                                  scoring=self._scoring,
+                                                  mask=self._mask)
+        return self._builder
+
+    def _get_builder_data(self):
+        """这个方法返回交给 :class:`builder.QRCodeBuilder` 编码的数据，
+        'mixed' 模式的二维码是所有数据段。
+        """
+        if self.mode == 'mixed':
+            return self.segments
+        return self.segments[0][1]
+
+    @property
+    def data(self):
+        """二维码的数据。如果内容是用8比特模式编码的字节，
+        字节会原封不动地编码，只有访问这个属性时才会用 `encoding`
+        属性解码成字符串，不能解码的话就是字节本身。
+        """
+        if self._data is None and self._payload is not None:
+            try:
+                self._data = self._payload.decode(self.encoding)
+            except UnicodeError:
+                self._data = self._payload
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def code(self):
+        """二维码的 :class:`builder.Matrix` 矩阵，
+        第一次访问这个属性时才会建立二维码。
+
+        如果 `pyqrcode.matrix_cache` 变量是一个缓存，会先在缓存中查找矩阵，
+        找不到才建立二维码，然后放入缓存。阅读 :mod:`pyqrcode.cache` 模块。
+        """
+        if self._code is None:
+            self._code = self._get_code()
+        return self._code
+
+    def _get_code(self):
+        """这个方法建立二维码的矩阵，或者从 `matrix_cache` 缓存中取出矩阵。"""
+        cache = matrix_cache
+        if cache is None or self._builder is not None or callable(self._mask):
+            return self.builder.code
+
+        key = self._get_cache_key()
+        data = cache.get(key)
+        if data is not None:
+            return builder.Matrix.from_bytes(data,
+                                             tables.version_size[self.version])
+
+        code = self.builder.code
+        cache.put(key, code.tobytes())
+        return code
+
+    def _get_cache_key(self):
+        """这个方法返回二维码在 `matrix_cache` 缓存中的键，
+        其中含有编码后的数据段、错误纠正级别、版本号，以及强制使用的遮罩。
+        数据段中已经含有模式和编码后的字节，所以同样的键总有同样的矩阵，
+        例如内容是字节还是字节阵列都没有关系。
+        """
+        #Numeric and alphanumeric text is always ASCII
+        segments = tuple((mode, bytes(data)
+                          if isinstance(data, _byte_types)
+                          else data.encode('ascii'))
+                         for mode, data in self.segments)
+        mask = self._mask if isinstance(self._mask, int) else None
+        return (segments, self.error, self.version, mask)
+
+    @property
+    def digest(self):
+        """二维码矩阵的 SHA-256 摘要，是一个十六进制字符串。
+        同样的矩阵总有同样的摘要，与内容是如何给出的无关，
+        在不同的进程和 Python 版本中也一样。
+        """
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.code.tobytes()).hexdigest()
+        return self._digest
+
+    def __eq__(self, other):
+        if not isinstance(other, QRCode):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    @property
+    def bit_length(self):
+        """数据编码后的比特数，包含模式指示符和数据长度区域，
+        不包含结束符和填充字节。不需要建立二维码。
+        """
+        segments = [(tables.modes[mode], data)
+                    for mode, data in self.segments]
+        return builder._get_segments_bit_length(segments, self.version)
+
+    @property
+    def blocks(self):
+        """二维码数据块的布局，是一个 :class:`reedsolomon.BlockPlan` 对象，
+        其中含有每个数据块的大小和错误纠正码字的个数。不需要建立二维码。
+        """
+        return reedsolomon.get_block_plan(self.version, self.error)
 
     def __str__(self):
         return repr(self)
@@ -237,107 +602,63 @@ class QRCode:
         
         返回一个元组，其中两个元素是检测到的模式和编码格式。
 
+        所有的测试都只用到数据中出现过的字符集合，
+        会与模块中预先建立好的每种模式的字符集合做比较，
+        不需要尝试编码数据。
+
         注意，二维码标准中的 ECI 编码格式还没有部署。
         """
-        def two_bytes(c):
-            """Output two byte character code as a single integer."""
-            def next_byte(b):
-                """Make sure that character code is an int. Python 2 and
-                3 compatibility.
-                """
-                if not isinstance(b, int):
-                    return ord(b)
-                else:
-                    return b
-
-            #Go through the data by looping to every other character
-            for i in range(0, len(c), 2):
-                yield (next_byte(c[i]) << 8) | next_byte(c[i+1])
-
-        #See if the data is a number
-        try:
-            if str(content).isdigit():
-                return 'numeric', encoding
-        except (TypeError, UnicodeError):
-            pass
+        #Mutable buffers are always binary payloads
+        if isinstance(content, (bytearray, memoryview)):
+            return 'binary', encoding
 
-        #See if that data is alphanumeric based on the standards
-        #special ASCII table
-        valid_characters = ''.join(tables.ascii_codes.keys())
-        
-        #Force the characters into a byte array
-        valid_characters = valid_characters.encode('ASCII')
+        if isinstance(content, bytes):
+            #Python 2 strings are bytes, so they can still be numeric
+            #or alphanumeric
+            if _PY2 or not content:
+                characters = set(content.decode('ASCII', 'replace'))
+                if content and characters <= builder._numeric_characters:
+                    return 'numeric', encoding
+                if characters <= builder._alphanumeric_characters:
+                    return 'alphanumeric', 'ASCII'
+
+            #The kanji test needs the characters, bytes are assumed to be
+            #Shift JIS unless told otherwise. Bytes that cannot be decoded
+            #become U+FFFD, which is not a kanji character.
+            if encoding is None:
+                encoding = 'shiftjis'
+            characters = set(content.decode(encoding, 'replace'))
+        else:
+            #The contents are not a string, so use the string representation
+            if not hasattr(content, 'encode'):
+                content = str(content)
 
-        try:
-            if isinstance(content, bytes):
-                c = content.decode('ASCII')
-            else:
-                c = str(content).encode('ASCII')
+            characters = set(content)
+            if content and characters <= builder._numeric_characters:
+                return 'numeric', encoding
 
-            if all(map(lambda x: x in valid_characters, c)):
+            #See if that data is alphanumeric based on the standards
+            #special ASCII table
+            if characters <= builder._alphanumeric_characters:
                 return 'alphanumeric', 'ASCII'
 
-        #This occurs if the content does not contain ASCII characters.
-        #Since the whole point of the if statement is to look for ASCII
-        #characters, the resulting mode should not be alphanumeric.
-        #Hence, this is not an error.
-        except TypeError:
-            pass
-        except UnicodeError:
-            pass
-
-        try:
-            if isinstance(content, bytes):
-                if encoding is None:
-                    encoding = 'shiftjis'
-
-                c = content.decode(encoding).encode('shiftjis')
-            else:
-                c = content.encode('shiftjis')
-            
-            #All kanji characters must be two bytes long, make sure the
-            #string length is not odd.
-            if len(c) % 2 != 0:
-                return 'binary', encoding
-
-            #Make sure the characters are actually in range.
-            for asint in two_bytes(c):
-                #Shift the two byte value as indicated by the standard
-                if not (0x8140 <= asint <= 0x9FFC or
-                        0xE040 <= asint <= 0xEBBF):
-                    return 'binary', encoding
-
+        #Kanji characters are never ASCII, which rules out most content
+        #without having to build the set of kanji characters
+        if min(characters) > '\x7f' and \
+           characters <= builder._get_kanji_characters():
             return 'kanji', encoding
 
-        except UnicodeError:
-            #This occurs if the content does not contain Shift JIS kanji
-            #characters. Hence, the resulting mode should not be kanji.
-            #This is not an error.
-            pass
-
         #All of the other attempts failed. The content can only be binary.
         return 'binary', encoding
 
     def _pick_best_fit(self, content):
         """这个实例方法返回尽可能最小的版本号。
         版本号会根据给出的错误纠正级别来满足所描述的数据内容。
+
+        版本号根据数据编码后确切的比特数来选择，
+        阅读 :func:`builder._pick_version` 函数。
         """
-        import math
-        
-        for version in range(1, 41):
-            #Get the maximum possible capacity
-            capacity = tables.data_capacity[version][self.error][self.mode_num]
-            
-            #Check the capacity
-            #Kanji's count in the table is "characters" which are two bytes
-            if (self.mode_num == tables.modes['kanji'] and
-                capacity >= math.ceil(len(content) / 2)):
-                return version
-            if capacity >= len(content):
-                return version
-
-        raise ValueError('The data will not fit in any QR code version '
-                         'with the given encoding and error level.')
+        return builder._pick_version(content, self.mode_num, self.error)
 
     def show(self, wait=1.2, scale=10, module_color=(0, 0, 0, 255),
             background=(255, 255, 255, 255), quiet_zone=4):
@@ -398,15 +719,13 @@ class QRCode:
         return builder._get_png_size(self.version, scale, quiet_zone)
 
     def png(self, file, scale=1, module_color=(0, 0, 0, 255),
-            background=(255, 255, 255, 255), quiet_zone=4):
+            background=(255, 255, 255, 255), quiet_zone=4, cache=None,
+            compression=None, strategy=None, row_filter=None, optimize=False):
         """这个实例方法是把二维码写成一个 PNG 图片文件。
         作为 PNG 结果会有1个深度。
         其中 `file` 位置参数是用来描述图片存储到哪里，参数值即可以是
         一种可写的流数据，也可以是一个文件路径。
 
-        .. note::
-            这个方法的使用要依赖 `pypng` 模块，所以要安装模块后才能真正建立 PNG 文件。
-
         这个方法会把给出的 *file* 参数值写成一个 PNG 文件。
         参数值可以是字符串文件路径，也可以是一个可写的流数据。
         如果使用流数据的话，参数 `file` 不会自动关闭。
@@ -417,6 +736,8 @@ class QRCode:
         参数值只可以使用整数。这个方法会把参数值都变成整数（例如，
         2.5会变成2，3会变成3）。
         你可以使用 :py:meth:`get_png_size` 方法来计算 PNG 图片的实际像素大小。
+        PNG 图片是一行一行压缩后写到 *file* 中的，所以即使 *scale*
+        参数值很大，用到的内存也只与一行像素的宽度有关。
 
         其中 *module_color* 参数是设置用什么颜色来对数据块进行编码。
         （绝大部分二维码数据块都是黑色）。
@@ -432,6 +753,21 @@ class QRCode:
         根据二维码标准，这个宽度应该是4个数据块。保留成可设置是因为
         许多应用程序不需要这个无噪点区域宽度，因为很少需要打印二维码。
 
+        其中 *cache* 参数是一个 :class:`pyqrcode.cache.RenderCache` 缓存。
+        同样的二维码用同样的选项输出过以后，PNG 图片直接从缓存中写出来。
+
+        其余的参数用来减小 PNG 文件。 *compression* 参数是 `zlib`
+        的压缩级别，0到9，默认值 `None` 是 zlib 的默认级别。
+        *strategy* 参数是 `zlib` 的压缩策略， 'default' 、 'filtered' 、
+        'huffman' 、 'rle' 或 'fixed' 。 *row_filter* 参数是每个扫描行的
+        PNG 过滤器， 'none' 、 'sub' 、 'up' 、 'average' 、 'paeth' ，
+        或者 'adaptive' 为每行选择一个过滤器。如果 *optimize* 参数值是
+        `True` 的话，会选择最小的颜色编码方式：黑白两色（包括其中一个
+        颜色完全透明）时使用1个比特的灰度图片，其它颜色使用调色板，
+        不透明的颜色不需要透明度数据。
+        二维码图片只有两种颜色，默认设置通常已经是最小的了，
+        可以用 `benchmarks/png_sizes.py` 脚本比较各种设置的字节数和时间。
+
         Example:
             >>> code = pyqrcode.create('Are you suggesting coconuts migrate?')
             >>> code.png('swallow.png', scale=5)
@@ -439,11 +775,19 @@ class QRCode:
                          module_color=(0x66, 0x33, 0x0),      #Dark brown
                          background=(0xff, 0xff, 0xff, 0x88)) #50% transparent white
         """
-        builder._png(self.code, self.version, file, scale,
-                     module_color, background, quiet_zone)
+        options = dict(scale=scale, module_color=module_color,
+                       background=background, quiet_zone=quiet_zone,
+                       compression=compression, strategy=strategy,
+                       row_filter=row_filter, optimize=optimize)
+        if cache is None:
+            builder._png(self.code, self.version, file, **options)
+        else:
+            self._render_cached(cache, 'png', builder._png, file, **options)
 
     def png_as_base64_str(self, scale=1, module_color=(0, 0, 0, 255),
-                          background=(255, 255, 255, 255), quiet_zone=4):
+                          background=(255, 255, 255, 255), quiet_zone=4,
+                          cache=None, compression=None, strategy=None,
+                          row_filter=None, optimize=False):
         """这个实例方法使用 png 渲染器后返回编码成 base64 字符串格式的 PNG 图片。
         对于建立动态 PNG 图片来说是有用的，常应用在网络开发中，因为不需要建立文件。
         
@@ -453,21 +797,87 @@ class QRCode:
             >>> html_img = '<img src="data:image/png;base64,{}">'.format(image_as_str)
 
         所有参数都会直接传递给 :py:meth:`png` 方法，对于参数的意义参考
-        `png` 方法文档字符串。
-        
-        .. note::
-            注意这个方法要依赖 `pypng` 模块，所以才能真正建立 PNG 图片格式。
-
+        `png` 方法文档字符串。有 *cache* 缓存时，base64 字符串也会以
+        'png_base64' 格式保存在缓存中，同样的选项不会再编码一次。
         """
-        import io
         import base64
+
+        def renderer():
+            with io.BytesIO() as virtual_file:
+                self.png(file=virtual_file, cache=cache, **options)
+                return base64.b64encode(virtual_file.getvalue()).decode("ascii")
+
+        options = dict(scale=scale, module_color=module_color,
+                       background=background, quiet_zone=quiet_zone,
+                       compression=compression, strategy=strategy,
+                       row_filter=row_filter, optimize=optimize)
+        if cache is None:
+            return renderer()
+        return cache.render(self, 'png_base64', options, renderer)
         
-        with io.BytesIO() as virtual_file:
-            self.png(file=virtual_file, scale=scale, module_color=module_color,
-                     background=background, quiet_zone=quiet_zone)
-            image_as_str = base64.b64encode(virtual_file.getvalue()).decode("ascii")
-        return image_as_str
-        
+    def raster(self, scale=1, quiet_zone=4, mode='1',
+               module_color=(0, 0, 0, 255), background=(255, 255, 255, 255)):
+        """这个实例方法把二维码返回成原始像素，不需要编码成图片文件格式，
+        返回一个 :data:`pyqrcode.builder.Raster` 元组，其中含有
+        `data` 像素字节、 `width` 宽、 `height` 高、 `stride` 每行的字节数和
+        `mode` 像素格式。 `data` 是 `bytes` 字节，支持缓冲协议，
+        所以 Pillow 、 NumPy 和图形界面库都可以不用复制直接使用。
+
+        其中 *mode* 参数是像素格式：
+
+        * '1' 每个像素1个比特，最高有效位在前，每行补满最后一个字节，
+          深色是0，浅色是1，与 Pillow 的 '1' 模式一样。
+        * 'L' 每个像素1个字节的灰度，深色是0，浅色是255。
+        * 'RGBA' 每个像素4个字节，颜色是 *module_color* 和 *background*
+          参数，与 :py:meth:`png` 方法的颜色参数一样，
+          背景色是 `None` 的话背景是透明的。
+        * 'RGB' 和 'BGRA' 与 'RGBA' 一样，只是没有透明度，
+          或者按照许多帧缓冲区的 BGRA 顺序排列。
+
+        其中 *scale* 和 *quiet_zone* 参数与 :py:meth:`png` 方法一样，
+        :py:meth:`get_png_size` 方法返回的就是宽和高。
+
+        Example:
+            >>> from PIL import Image
+            >>> code = pyqrcode.create('Kiosk')
+            >>> r = code.raster(scale=4, mode='L')
+            >>> image = Image.frombuffer('L', (r.width, r.height), r.data,
+            ...                          'raw', 'L', r.stride, 1)
+            >>> import numpy
+            >>> pixels = numpy.frombuffer(r.data, numpy.uint8)
+            >>> pixels = pixels.reshape(r.height, r.stride)
+        """
+        return builder._raster(self.code, self.version, scale, quiet_zone,
+                               mode, module_color, background)
+
+    def raster_into(self, buffer, x=0, y=0, stride=None, mode='RGBA',
+                    scale=1, quiet_zone=4, module_color=(0, 0, 0, 255),
+                    background=(255, 255, 255, 255)):
+        """这个实例方法把二维码的像素直接画到一个已有的可写缓冲区中，
+        例如一个 `bytearray` 字节阵列、一个 `mmap` 内存映射，
+        或者一个 NumPy 阵列，用来把二维码合成到页面或帧缓冲区里。
+        方法返回画出的图片的 (宽, 高) 元组，单位是像素。
+
+        二维码的左上角画在 (*x*, *y*) 像素的位置上，
+        *stride* 参数是缓冲区中每行的字节数。多维的缓冲区（例如 NumPy
+        阵列）可以不给出 *stride* 参数，这时使用第一维的步长，
+        但缓冲区必须是 C 连续的；Python 2 只支持一维的字节缓冲区。
+        二维码以外的像素都不会改变，'1' 模式中同一个字节里的
+        其它比特也不会改变。放不下二维码时会引发 `ValueError` 异常。
+
+        其余参数与 :py:meth:`raster` 方法一样。像素是一行一行直接写到
+        缓冲区里的，不会建立整个图片，每一行数据块只展开一次。
+
+        Example:
+            >>> page = bytearray(1000 * 800 * 4)
+            >>> code = pyqrcode.create('Label 0001')
+            >>> code.raster_into(page, x=40, y=60, stride=1000 * 4, scale=4)
+            (132, 132)
+        """
+        return builder._raster_into(self.code, self.version, buffer, x, y,
+                                    stride, mode, scale, quiet_zone,
+                                    module_color, background)
+
     def xbm(self, scale=1, quiet_zone=4):
         """这个实例方法返回一种 XBM 图片格式的二维码字符串。
         对于 XBM 格式来说，这是一种黑白图片格式，看起来像一个 C 头部文件一样。
@@ -505,7 +915,7 @@ class QRCode:
     def svg(self, file, scale=1, module_color='#000', background=None,
             quiet_zone=4, xmldecl=True, svgns=True, title=None,
             svgclass='pyqrcode', lineclass='pyqrline', omithw=False,
-            debug=False):
+            debug=False, cache=None):
         """这个实例方法是把二维码写成一种 SVG 文档格式。
         二维码只会把数据块绘制成1。数据块都会用一行来绘制，
         例如一行中的连续数据块都会绘制在单行里。
@@ -545,6 +955,9 @@ class QRCode:
         其中 *quiet_zone* 参数是设置无噪点区域宽应该是多大。
         根据二维码标准这个参数值应该是4个数据卡宽。保留成可设置是因为许多应用
         程序中不需要无噪点区域宽，因为很少会打印二维码。
+
+        其中 *cache* 参数是一个 :class:`pyqrcode.cache.RenderCache` 缓存。
+        同样的二维码用同样的选项输出过以后，SVG 文档直接从缓存中写出来。
         
         Example:
             >>> code = pyqrcode.create('Hello. Uhh, can we have your liver?')
@@ -552,11 +965,32 @@ class QRCode:
             >>> code.svg('live-organ-transplants.svg', scale=4,
                          module_color='brown', background='0xFFFFFF')
         """
-        builder._svg(self.code, self.version, file, scale=scale, 
-                     module_color=module_color, background=background,
-                     quiet_zone=quiet_zone, xmldecl=xmldecl, svgns=svgns, 
-                     title=title, svgclass=svgclass, lineclass=lineclass,
-                     omithw=omithw, debug=debug)
+        options = dict(scale=scale, module_color=module_color,
+                       background=background, quiet_zone=quiet_zone,
+                       xmldecl=xmldecl, svgns=svgns, title=title,
+                       svgclass=svgclass, lineclass=lineclass, omithw=omithw,
+                       debug=debug)
+        if cache is None:
+            builder._svg(self.code, self.version, file, **options)
+        else:
+            self._render_cached(cache, 'svg', builder._svg, file, **options)
+
+    def _render_cached(self, cache, kind, render, file, **options):
+        """这个方法用 *render* 输出函数把二维码写到 *file* 文件中，
+        输出的字节保存在 *cache* 缓存中，同样的输出选项只输出一次。
+        """
+        def renderer():
+            with io.BytesIO() as out:
+                render(self.code, self.version, out, **options)
+                return out.getvalue()
+
+        data = cache.render(self, kind, options, renderer)
+        f, autoclose = builder._get_writable(file, 'wb')
+        try:
+            f.write(data)
+        finally:
+            if autoclose:
+                f.close()
 
     def eps(self, file, scale=1, module_color=(0, 0, 0),
             background=None, quiet_zone=4):
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013, Michael Nooner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""本模块把批量建立和输出二维码的工作分配到多个 CPU 核上。
+
+建立和输出二维码都是纯 Python 的计算，一个进程只能用到一个 CPU 核。
+:func:`generate` 函数把内容分成多个数据块，交给一个进程池、线程池，
+或者 Python 3.14 的解释器池去完成，然后按照内容的顺序，
+或者按照完成的顺序产生结果。
+
+Examples:
+        >>> import pyqrcode.batch
+        >>> labels = ('SN-{0:08d}'.format(n) for n in range(100000))
+        >>> for result in pyqrcode.batch.generate(labels, render='svg',
+        ...                                       render_options={'scale': 4}):
+        ...     if result.error is None:
+        ...         save(result.index, result.value)
+"""
+
+#Imports required for 2.x support
+from __future__ import absolute_import, division, print_function, with_statement, unicode_literals
+
+import collections
+import io
+import itertools
+import multiprocessing
+import pyqrcode
+
+try:
+    import concurrent.futures as futures
+except ImportError:
+    futures = None  # Python 2 without the futures backport
+
+#: The result of one content of a batch. The *index* is the position of the
+#: content in the input, *value* is the matrix or the rendered code, and
+#: *error* is the exception raised for this content, or None.
+Result = collections.namedtuple('Result', 'index content value error')
+
+#: The names of the executor classes of the backends.
+_backends = {'process': 'ProcessPoolExecutor',
+             'thread': 'ThreadPoolExecutor',
+             'interpreter': 'InterpreterPoolExecutor'}
+
+#: The renderers that write into a file, and the stream they write into.
+_file_renderers = {'png': io.BytesIO, 'svg': io.BytesIO, 'eps': io.StringIO}
+
+#: The renderers that return the rendered code.
+_value_renderers = ('text', 'xbm', 'terminal', 'png_as_base64_str')
+
+
+def generate(contents, error='H', version=None, mode=None, encoding=None,
+             scoring=None, mask=None, render=None, render_options=None,
+             backend='process', workers=None, chunksize=64, max_pending=None,
+             ordered=True):
+    """这个函数是一个生成器，为 *contents* 参数中的每个内容建立一个二维码，
+    建立和输出的工作分配给多个工作者完成，每个内容产生一个 :data:`Result`
+    结果。其中 *error* 、 *version* 、 *mode* 、 *encoding* 、 *scoring*
+    和 *mask* 参数与 :func:`pyqrcode.create` 函数一样，对所有二维码都有效。
+
+    其中 *render* 参数是输出二维码的方法名称。默认值 `None` 的结果值是
+    二维码的 :class:`builder.Matrix` 矩阵。 'png' 和 'svg' 的结果值是字节，
+    'eps' 、 'text' 、 'xbm' 、 'terminal' 和 'png_as_base64_str'
+    的结果值是字符串。 *render_options* 参数是一个字典，
+    其中含有输出方法的关键字参数，例如 `{'scale': 4}` 。
+
+    其中 *backend* 参数是 'process' 进程池（默认值）、 'thread' 线程池，
+    或者 'interpreter' 解释器池，解释器池需要 Python 3.14 。
+    也可以是一个 `concurrent.futures.Executor` 实例，这个执行器用完后
+    不会关闭。 *workers* 参数是池中工作者的个数，默认值由执行器决定。
+    进程池和解释器池要求内容和输出选项都可以被 pickle 序列化。
+
+    内容按照 *chunksize* 参数分成数据块，每个数据块是一项工作，
+    大的数据块减少了进程之间的通信。同一时间最多有 *max_pending*
+    个数据块在工作中，默认值是工作者个数的两倍，
+    这样即使内容来自一个很长的生成器，内存用量也是有限的。
+    下一个数据块只在有结果被取走后才会读取。
+
+    如果 *ordered* 参数是 `True` ，结果按照内容的顺序产生，
+    否则按照数据块完成的顺序产生。
+
+    一个内容建立或输出失败不会中止整批工作，异常保存在结果的
+    `error` 项中，这时 `value` 项是 `None` 。
+
+    参数不合法时，在读取第一个内容之前就会引发 `ValueError` 异常。
+    """
+    #Check the options before any work is started
+    pyqrcode.create_many((), error, version, mode, encoding, scoring, mask)
+
+    if render is not None and render not in _file_renderers and \
+       render not in _value_renderers:
+        raise ValueError('{0} is not a valid renderer.'.format(render))
+    if render_options is None:
+        render_options = {}
+
+    if chunksize < 1:
+        raise ValueError('Illegal chunk size {0}, the chunk size must be at '
+                         'least 1.'.format(chunksize))
+    if workers is not None and workers < 1:
+        raise ValueError('Illegal number of workers {0}, there must be at '
+                         'least 1 worker.'.format(workers))
+    if max_pending is None:
+        max_pending = 2 * (workers or multiprocessing.cpu_count())
+    elif max_pending < 1:
+        raise ValueError('Illegal max_pending {0}, at least 1 chunk must be '
+                         'pending.'.format(max_pending))
+
+    executor_class = _get_executor_class(backend)
+    options = (error, version, mode, encoding, scoring, mask, render,
+               render_options)
+    return _generate(backend, executor_class, workers, contents, options,
+                     chunksize, max_pending, ordered)
+
+
+def _get_executor_class(backend):
+    """这个函数返回 *backend* 参数描述的执行器类。如果 *backend*
+    参数已经是一个执行器，就返回 `None` 值。
+    """
+    #A ready executor is used as it is
+    if hasattr(backend, 'submit'):
+        return None
+
+    if backend not in _backends:
+        raise ValueError('{0} is not a valid backend.'.format(backend))
+
+    executor_class = getattr(futures, _backends[backend], None)
+    if executor_class is None:
+        raise ValueError('The {0} backend is not available in this version '
+                         'of Python.'.format(backend))
+    return executor_class
+
+
+def _generate(backend, executor_class, workers, contents, options, chunksize,
+              max_pending, ordered):
+    """这是 :func:`generate` 函数的生成器，参数都已经检查过了。
+    执行器在读取第一个结果时才会建立，没有用过的生成器不会留下工作者。
+    """
+    #Split the numbered contents into chunks, only as many as needed
+    numbered = enumerate(contents)
+    chunks = iter(lambda: list(itertools.islice(numbered, chunksize)), [])
+
+    if executor_class is None:
+        executor = backend
+    else:
+        executor = executor_class(workers)
+
+    #The pending (future, chunk) pairs, the chunk is needed if it fails
+    pending = collections.deque()
+    try:
+        #Keep at most max_pending chunks in flight, a new chunk is only
+        #read once the results of another chunk were taken
+        for chunk in itertools.islice(chunks, max_pending):
+            pending.append((executor.submit(_run_chunk, chunk, options),
+                            chunk))
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished = futures.wait([future for future, _ in pending],
+                                        return_when=futures.FIRST_COMPLETED)[0]
+                done = [item for item in pending if item[0] in finished]
+                pending = collections.deque(item for item in pending
+                                            if item[0] not in finished)
+
+            for future, chunk in done:
+                for following in itertools.islice(chunks, 1):
+                    pending.append((executor.submit(_run_chunk, following,
+                                                    options), following))
+                for result in _get_results(future, chunk):
+                    yield result
+    finally:
+        #The consumer may stop early, do not run the remaining chunks
+        for future, _ in pending:
+            future.cancel()
+        if executor_class is not None:
+            executor.shutdown()
+
+
+def _get_results(future, chunk):
+    """这个函数返回 *future* 中一个数据块的结果列表。如果整个数据块失败了，
+    例如内容不能被 pickle 序列化或者工作者进程中止了，
+    *chunk* 数据块中每个内容都得到一个含有这个异常的结果。
+    """
+    try:
+        return future.result()
+    except Exception as ex:
+        return [Result(index, content, None, ex) for index, content in chunk]
+
+
+def _run_chunk(chunk, options):
+    """这个函数在工作者中运行，为一个数据块建立二维码，返回结果的列表。
+    其中 *chunk* 参数是一个 (索引, 内容) 元组的列表。
+    """
+    error, version, mode, encoding, scoring, mask, render, \
+        render_options = options
+
+    results = []
+    for index, content in chunk:
+        try:
+            qr = pyqrcode.create(content, error, version, mode, encoding,
+                                 scoring, mask)
+            value = _render(qr, render, render_options)
+        except Exception as ex:
+            results.append(Result(index, content, None, ex))
+        else:
+            results.append(Result(index, content, value, None))
+    return results
+
+
+def _render(qr, render, render_options):
+    """这个函数用 *render* 参数描述的方法输出二维码，然后返回结果值。"""
+    if render is None:
+        return qr.code
+
+    if render in _file_renderers:
+        out = _file_renderers[render]()
+        getattr(qr, render)(out, **render_options)
+        return out.getvalue()
+
+    return getattr(qr, render)(**render_options)
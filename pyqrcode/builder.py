@@ -32,11 +32,273 @@
 from __future__ import absolute_import, division, print_function, with_statement, unicode_literals
 
 import pyqrcode.tables as tables
+import pyqrcode.reedsolomon as reedsolomon
+import array
+import binascii
+import bisect
+import collections
 import io
 import itertools
 import math
+import operator
+import zlib
 
-class QRCodeBuilder:
+#: This table holds the eight bits of every possible byte value, most
+#: significant bit first. It lets the bits of a stream be read without
+#: formatting each byte as a string.
+_byte_bits = tuple(tuple((b >> (7 - i)) & 1 for i in range(8))
+                   for b in range(256))
+
+#: The same bits as ASCII '0' and '1' characters, used to gather the bits
+#: of a stream into a matrix in one pass.
+_byte_ascii = tuple('{0:08b}'.format(b).encode('ascii') for b in range(256))
+
+
+class BitStream(object):
+    """这个类是一种比特流，用来建立二维码的数据。
+    比特会紧凑地存储在一个 `bytearray` 字节阵列中，不会再用
+    '0' 和 '1' 字符组成的字符串来表示。还没有满一个字节的比特
+    都保存在一个整数累加器里。
+
+    其中 *data* 参数是可选的，是比特流起始所含有的完整字节。
+    """
+    def __init__(self, data=None):
+        self.buffer = bytearray(data) if data is not None else bytearray()
+
+        #Bits not yet forming a complete byte, and how many there are
+        self._acc = 0
+        self._nbits = 0
+
+    def __len__(self):
+        """返回比特流所含有的比特数量。"""
+        return (len(self.buffer) << 3) + self._nbits
+
+    def write(self, value, length):
+        """这个方法把整数 *value* 写成 *length* 个比特，
+        最高有效位在前。
+        """
+        acc = (self._acc << length) | (value & ((1 << length) - 1))
+        nbits = self._nbits + length
+        append = self.buffer.append
+        while nbits >= 8:
+            nbits -= 8
+            append((acc >> nbits) & 0xFF)
+        self._acc = acc & ((1 << nbits) - 1)
+        self._nbits = nbits
+
+    def write_bytes(self, data):
+        """这个方法把字节数据 *data* 中的每个字节都写成8个比特。
+        其中 *data* 参数可以是 `bytes` 、 `bytearray` 或 `memoryview` 对象。
+        """
+        if not self._nbits:
+            self.buffer.extend(data)
+            return
+        if not len(data):
+            return
+
+        #The bytes are not aligned, shift them all at once as one integer
+        #behind the pending bits instead of one byte at a time
+        nbits = self._nbits
+        length = len(data)
+        value = (self._acc << (length << 3)) | \
+                int(binascii.hexlify(data), 16)
+        self.buffer.extend(binascii.unhexlify(
+            '{0:0{1}x}'.format(value >> nbits, length << 1)))
+        self._acc = value & ((1 << nbits) - 1)
+
+    def tobytes(self):
+        """这个方法把比特流返回成 `bytes` 字节。
+        如果最后一个字节不完整的话，缺少的比特会填充成0。
+        """
+        if not self._nbits:
+            return bytes(self.buffer)
+        return bytes(self.buffer +
+                     bytearray([(self._acc << (8 - self._nbits)) & 0xFF]))
+
+    def bits(self):
+        """这个方法返回一个迭代器，可以一个一个地读取比特流中的比特。"""
+        stream = itertools.chain.from_iterable(_byte_bits[b]
+                                               for b in self.buffer)
+        if not self._nbits:
+            return stream
+        tail = _byte_bits[(self._acc << (8 - self._nbits)) & 0xFF]
+        return itertools.chain(stream, tail[:self._nbits])
+
+    def getvalue(self):
+        """这个方法把比特流返回成 '0' 和 '1' 组成的字符串。"""
+        length = len(self)
+        if not length:
+            return ''
+        value = int(binascii.hexlify(self.tobytes()), 16) >> (-length % 8)
+        return '{0:0{1}b}'.format(value, length)
+
+
+def _make_translation(source, target):
+    """返回一个可以用于 `bytearray.translate` 的256字节转换表，
+    其中 *source* 中的字节会转换成 *target* 中对应的字节。
+    """
+    table = bytearray(range(256))
+    for s, t in zip(bytearray(source), bytearray(target)):
+        table[s] = t
+    return bytes(table)
+
+#: Translates the ASCII characters '0' and '1' into the bytes 0 and 1.
+_ascii_to_bits = _make_translation(b'01', b'\x00\x01')
+
+#: Translates module values into ASCII '0' and '1'. Anything other
+#: than a dark module (e.g. an unset module) becomes '0'.
+_bits_to_ascii = _make_translation(bytearray(range(256)),
+                                   b'01' + b'0' * 254)
+
+
+def _ascii_to_int(digits):
+    """把一个含有 ASCII '0' 和 '1' 字符的字节阵列转换成整数。
+    Python 2 的 `int` 函数不接受 `bytearray` 字节阵列，所以要先解码。
+    """
+    return int(bytes(digits).decode('ascii'), 2)
+
+
+#: The value of a module that has not been set yet. It is rendered as
+#: an "error" module by the renderers.
+_UNSET = 2
+
+
+def _int_to_bits(value, length):
+    """把一个整数转换成 *length* 个字节，每个字节是一个比特，
+    最高有效位在前。
+    """
+    if not length:
+        return b''
+    return '{0:0{1}b}'.format(value, length).encode('ascii') \
+                                            .translate(_ascii_to_bits)
+
+
+class _Row(bytearray):
+    """这个类是矩阵中的一行数据块。
+    给一个数据块赋一个非整数值（例如 ' '）会把它标记成还没有设置，
+    这样可以像过去一样在调试时标记错误的数据块。
+    """
+    __slots__ = ()
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, slice):
+            try:
+                value = operator.index(value)
+            except TypeError:
+                value = _UNSET
+        bytearray.__setitem__(self, index, value)
+
+
+class Matrix(object):
+    """这个类是一种紧凑的二维码矩阵。
+
+    每一行都是一个 `bytearray` 字节阵列，其中每个字节是一个数据块：
+    1 表示深色数据块，0 表示浅色数据块。与过去的列表嵌套列表一样，
+    可以使用 ``code[row][col]`` 来索引，也可以对行和每一行进行迭代，
+    所以渲染器和用户的代码都可以照常使用。
+
+    另外，:py:meth:`row_bits` 和 :py:meth:`column_bits` 方法
+    可以把每一行或每一列返回成一个整数比特掩码，第0列（或第0行）
+    是最高有效位，这样渲染器和惩罚计分都可以直接使用比特运算。
+    """
+    def __init__(self, rows):
+        self.rows = [_Row(row) for row in rows]
+
+    @classmethod
+    def blank(cls, size, value=0):
+        """返回一个 *size* 乘以 *size* 大小的矩阵，
+        其中所有数据块的值都是 *value* 。
+        """
+        return cls(bytearray([value]) * size for row in range(size))
+
+    @classmethod
+    def from_int(cls, value, size):
+        """从一个按行排列的整数建立矩阵，
+        第一个数据块是最高有效位。阅读 :py:meth:`to_int` 方法。
+        """
+        return cls.from_bytes(_int_to_bits(value, size * size), size)
+
+    @classmethod
+    def from_bytes(cls, data, size):
+        """从按行排列的字节数据 *data* 建立矩阵，其中每个字节是一个数据块。"""
+        return cls(data[i:i+size] for i in range(0, size * size, size))
+
+    @property
+    def size(self):
+        """矩阵的宽和高，以数据块为单位。"""
+        return len(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __eq__(self, other):
+        if isinstance(other, Matrix):
+            return self.rows == other.rows
+        try:
+            return [list(row) for row in self.rows] == \
+                   [list(row) for row in other]
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Matrix({0!r})'.format(self.tolist())
+
+    def copy(self):
+        """返回这个矩阵的一个副本。"""
+        return Matrix(self.rows)
+
+    def tolist(self):
+        """把矩阵返回成列表嵌套列表形式。"""
+        return [list(row) for row in self.rows]
+
+    def tobytes(self):
+        """把矩阵按行返回成 `bytes` 字节，其中每个字节是一个数据块。"""
+        return bytes(bytearray().join(self.rows))
+
+    def to_int(self):
+        """把整个矩阵按行返回成一个整数，第一个数据块是最高有效位。
+        只有深色数据块是1，其它都是0。
+        """
+        if not self.rows:
+            return 0
+        return _ascii_to_int(bytearray().join(self.rows)
+                                        .translate(_bits_to_ascii))
+
+    def row_bits(self):
+        """返回一个列表，其中每个元素是一行的整数比特掩码，
+        第0列是最高有效位。
+        """
+        return [_ascii_to_int(row.translate(_bits_to_ascii))
+                for row in self.rows]
+
+    def column_bits(self):
+        """返回一个列表，其中每个元素是一列的整数比特掩码，
+        第0行是最高有效位。
+        """
+        flat = bytearray().join(self.rows).translate(_bits_to_ascii)
+        size = len(self.rows)
+        return [_ascii_to_int(flat[col::size]) for col in range(size)]
+
+    def transpose(self):
+        """返回这个矩阵的转置矩阵。"""
+        flat = bytearray().join(self.rows)
+        size = len(self.rows)
+        return Matrix(flat[col::size] for col in range(size))
+
+
+class QRCodeBuilder(object):
     """这个类是根据二维码标准生成一个二维码。
     意味着作为内部使用，而不是用户是用！！！
 
@@ -59,15 +321,42 @@ class QRCodeBuilder:
     二维码调试器网址是：
         http://qrlogo.kaarposoft.dk/qrdecode.html
     """
-    def __init__(self, data, version, mode, error):
-        """阅读 :py:class:`pyqrcode.QRCode` 了解参数的信息。"""
+    def __init__(self, data, version, mode, error, scoring=None, mask=None):
+        """阅读 :py:class:`pyqrcode.QRCode` 了解参数的信息。
+
+        其中 *mask* 参数描述选择遮罩的策略，可以是 'exhaustive' 计算所有遮罩，
+        'bound' 在遮罩的部分惩罚分已经不低于最好的遮罩时就停止计算，
+        一个0到7的整数直接使用该遮罩，或者是一个可调用对象，
+        参数是这个类的实例，返回选择的遮罩索引位。默认值是 'exhaustive' 。
+        策略保存在 `mask_strategy` 属性中。
+
+        如果 *mode* 参数是 'mixed' ，*data* 参数就是一个列表，
+        其中每个元素是一个 (模式, 数据) 元组，按顺序编码成多个数据段。
+        每个数据段的编码模式保存在 `segments` 属性中。
+
+        其中 *scoring* 参数描述计算遮罩惩罚分所用的后端，
+        可以是 'python' 或 'numpy'，默认值是 `default_scoring` 变量的值。
+        如果没有安装 NumPy ，'numpy' 后端会退回到 'python' 后端。
+        实际使用的后端保存在 `scoring` 属性中。
+        """
         #Set what data we are going to use to generate
         #the QR code
         self.data = data
 
-        #Check that the user passed in a valid mode
-        if mode in tables.modes:
+        #Check that the user passed in a valid mode. The data of a 'mixed'
+        #code is a list of (mode, data) segments, see _make_segments.
+        if mode == 'mixed':
+            self.mode = None
+            self.segments = []
+            for segment_mode, segment_data in data:
+                if segment_mode not in tables.modes:
+                    raise ValueError('{0} is not a valid '
+                                     'mode.'.format(segment_mode))
+                self.segments.append((tables.modes[segment_mode],
+                                      segment_data))
+        elif mode in tables.modes:
             self.mode = tables.modes[mode]
+            self.segments = [(self.mode, data)]
         else:
             raise ValueError('{0} is not a valid mode.'.format(mode))
 
@@ -84,11 +373,15 @@ class QRCodeBuilder:
             raise ValueError("Illegal version {0}, version must be between "
                              "1 and 40.".format(version))
 
+        #Check the scoring backend and the mask strategy
+        self.scoring = _get_scoring(scoring)
+        self.mask_strategy = _get_mask_strategy(mask)
+
         #Look up the proper row for error correction code words
         self.error_code_words = tables.eccwbi[version][self.error]
 
-        #This property will hold the binary string as it is built
-        self.buffer = io.StringIO()
+        #This property will hold the bit stream as it is built
+        self.buffer = BitStream()
 
         #Create the binary data block
         self.add_data()
@@ -108,413 +401,274 @@ class QRCodeBuilder:
             return itertools.zip_longest(*args, fillvalue=fillvalue)
         return itertools.izip_longest(*args, fillvalue=fillvalue)
 
-    def binary_string(self, data, length):
-        """这个实例方法返回长度为n的字符串，
-        字符串内容是给出数据的二进制形式。
-
-        这个方法基本上是用来建立已知规模的比特区域。
-        """
-        return '{{0:0{0}b}}'.format(length).format(int(data))
-
-    def get_data_length(self):
+    def get_data_length(self, mode=None, data=None):
         """含有一个"数据长度"区域的二维码。
         这个方法是用来建立这种区域用的。
-        返回一个表示这种长度的二进制字符串。
+        返回一个元组，其中两个元素是数据长度值和这种区域的比特宽度。
+        默认使用 `mode` 和 `data` 属性，也可以描述一个数据段的模式和数据。
         """
+        if mode is None:
+            mode = self.mode
+        if data is None:
+            data = self.data
 
-        #The "data length" field varies by the type of code and its mode.
-        #discover how long the "data length" field should be.
-        if 1 <= self.version <= 9:
-            max_version = 9
-        elif 10 <= self.version <= 26:
-            max_version = 26
-        elif 27 <= self.version <= 40:
-            max_version = 40
-
-        data_length = tables.data_length_field[max_version][self.mode]
+        data_length = _get_length_bits(self.version, mode)
 
-        if self.mode != tables.modes['kanji']:
-            length_string = self.binary_string(len(self.data), data_length)
+        if mode != tables.modes['kanji']:
+            length = len(data)
         else:
-            length_string = self.binary_string(len(self.data) / 2, data_length)
+            length = len(data) // 2
 
-        if len(length_string) > data_length:
+        if length >= 1 << data_length:
             raise ValueError('The supplied data will not fit '
                                'within this version of a QRCode.')
-        return length_string
+        return length, data_length
 
-    def encode(self):
-        """这个方法把数据编码成一种二进制字符串，
+    def encode(self, buf, mode=None, data=None):
+        """这个方法把数据编码后写入 `buf` 比特流中，
         使用相应模式的算法。
+        默认使用 `mode` 和 `data` 属性，也可以描述一个数据段的模式和数据。
         """
-        if self.mode == tables.modes['alphanumeric']:
-            encoded = self.encode_alphanumeric()
-        elif self.mode == tables.modes['numeric']:
-            encoded = self.encode_numeric()
-        elif self.mode == tables.modes['binary']:
-            encoded = self.encode_bytes()
-        elif self.mode == tables.modes['kanji']:
-            encoded = self.encode_kanji()
-        return encoded
-
-    def encode_alphanumeric(self):
+        if mode is None:
+            mode = self.mode
+
+        if mode == tables.modes['alphanumeric']:
+            self.encode_alphanumeric(buf, data)
+        elif mode == tables.modes['numeric']:
+            self.encode_numeric(buf, data)
+        elif mode == tables.modes['binary']:
+            self.encode_bytes(buf, data)
+        elif mode == tables.modes['kanji']:
+            self.encode_kanji(buf, data)
+
+    def encode_alphanumeric(self, buf, data=None):
         """这个方法是字母数字组合模式编码二维码数据的算法。
-        返回的数据会编码成一种二进制字符串。
+        编码完的数据会写入 `buf` 比特流中。
+        默认编码 `data` 属性。
         """
         #Convert the string to upper case
-        self.data = self.data.upper()
+        if data is None:
+            self.data = self.data.upper()
+            data = self.data
+        else:
+            data = data.upper()
 
         #Change the data such that it uses a QR code ascii table
         ascii = []
-        for char in self.data:
+        for char in data:
             if isinstance(char, int):
                 ascii.append(tables.ascii_codes[chr(char)])
             else:
                 ascii.append(tables.ascii_codes[char])
         
         #Now perform the algorithm that will make the ascii into bit fields
-        with io.StringIO() as buf:
-            for (a,b) in self.grouper(2, ascii):
-                if b is not None:
-                    buf.write(self.binary_string((45*a)+b, 11))
-                else:
-                    #This occurs when there is an odd number
-                    #of characters in the data
-                    buf.write(self.binary_string(a, 6))
-
-            #Return the binary string
-            return buf.getvalue()
-
-    def encode_numeric(self):
+        for (a,b) in self.grouper(2, ascii):
+            if b is not None:
+                buf.write((45*a)+b, 11)
+            else:
+                #This occurs when there is an odd number
+                #of characters in the data
+                buf.write(a, 6)
+
+    def encode_numeric(self, buf, data=None):
         """这个方法是纯数字模式编码二维码数据的算法。
-        返回的数据会编码成一种二进制字符串。
+        编码完的数据会写入 `buf` 比特流中。
+        默认编码 `data` 属性。
         """
-        with io.StringIO() as buf:
-            #Break the number into groups of three digits
-            for triplet in self.grouper(3, self.data):
-                number = ''
-                for digit in triplet:
-                    if isinstance(digit, int):
-                        digit = chr(digit)
-
-                    #Only build the string if digit is not None
-                    if digit:
-                        number = ''.join([number, digit])
-                    else:
-                        break
-
-                #If the number is one digits, make a 4 bit field
-                if len(number) == 1:
-                    bin = self.binary_string(number, 4)
-
-                #If the number is two digits, make a 7 bit field
-                elif len(number) == 2:
-                    bin = self.binary_string(number, 7)
-
-                #Three digit numbers use a 10 bit field
-                else:
-                    bin = self.binary_string(number, 10)
-
-                buf.write(bin)
-            return buf.getvalue()
-
-    def encode_bytes(self):
+        if data is None:
+            data = self.data
+
+        #Break the number into groups of three digits. A one digit group
+        #uses a 4 bit field, two digits a 7 bit field and three digits
+        #a 10 bit field.
+        for i in range(0, len(data), 3):
+            triplet = data[i:i+3]
+            buf.write(int(triplet), (4, 7, 10)[len(triplet) - 1])
+
+    def encode_bytes(self, buf, data=None):
         """这个方法是8比特模式编码二维码数据的算法。
-        返回的数据会编码成一种二进制字符串。
+        编码完的数据会写入 `buf` 比特流中。
+        默认编码 `data` 属性。
         """
-        with io.StringIO() as buf:
-            for char in self.data:
-                if not isinstance(char, int):
-                    buf.write('{{0:0{0}b}}'.format(8).format(ord(char)))
-                else:
-                    buf.write('{{0:0{0}b}}'.format(8).format(char))
-            return buf.getvalue()
-
-    def encode_kanji(self):
+        if data is None:
+            data = self.data
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            buf.write_bytes(data)
+        else:
+            for char in data:
+                buf.write(ord(char), 8)
+
+    def encode_kanji(self, buf, data=None):
         """这个方法是kanji片假名模式编码二维码数据的算法。
-        返回的数据会编码成一种二进制字符串。
+        编码完的数据会写入 `buf` 比特流中。
+        默认编码 `data` 属性。
         """
-        def two_bytes(data):
-            """Output two byte character code as a single integer."""
-            def next_byte(b):
-                """Make sure that character code is an int. Python 2 and
-                3 compatibility.
-                """
-                if not isinstance(b, int):
-                    return ord(b)
-                else:
-                    return b
-
-            #Go through the data by looping to every other character
-            for i in range(0, len(data), 2):
-                yield (next_byte(data[i]) << 8) | next_byte(data[i+1])
-
-        #Force the data into Kanji encoded bytes
-        if isinstance(self.data, bytes):
-            data = self.data.decode('shiftjis').encode('shiftjis')
+        if data is None:
+            data = self.data
+
+        #Force the data into Kanji encoded bytes, bytes are already
+        #Shift JIS encoded
+        if isinstance(data, bytes):
+            data = bytearray(data)
         else:
-            data = self.data.encode('shiftjis')
+            data = bytearray(data.encode('shiftjis'))
         
         #Now perform the algorithm that will make the kanji into 13 bit fields
-        with io.StringIO() as buf:
-            for asint in two_bytes(data):
-                #Shift the two byte value as indicated by the standard
-                if 0x8140 <= asint <= 0x9FFC:
-                    difference = asint - 0x8140
-                elif 0xE040 <= asint <= 0xEBBF:
-                    difference = asint - 0xC140
+        for i in range(0, len(data), 2):
+            asint = (data[i] << 8) | data[i+1]
 
-                #Split the new value into most and least significant bytes
-                msb = (difference >> 8)
-                lsb = (difference & 0x00FF)
+            #Shift the two byte value as indicated by the standard
+            if 0x8140 <= asint <= 0x9FFC:
+                difference = asint - 0x8140
+            elif 0xE040 <= asint <= 0xEBBF:
+                difference = asint - 0xC140
 
-                #Calculate the actual 13 bit binary value
-                buf.write('{0:013b}'.format((msb * 0xC0) + lsb))
-            #Return the binary string
-            return buf.getvalue()
+            #Split the new value into most and least significant bytes
+            msb = (difference >> 8)
+            lsb = (difference & 0x00FF)
+
+            #Calculate the actual 13 bit binary value
+            buf.write((msb * 0xC0) + lsb, 13)
 
 
     def add_data(self):
-        """这个方法正确地建立一个二维码数据字符串。
+        """这个方法正确地建立一个二维码数据比特流。
         负责二维码标准所需的插入模式。
         """
-        #Encode the data into a QR code
-        self.buffer.write(self.binary_string(self.mode, 4))
-        self.buffer.write(self.get_data_length())
-        self.buffer.write(self.encode())
-
-        #Converts the buffer into "code word" integers.
-        #The online debugger outputs them this way, makes
-        #for easier comparisons.
-        #s = self.buffer.getvalue()
-        #for i in range(0, len(s), 8):
-        #    print(int(s[i:i+8], 2), end=',')
-        #print()
-        
-        #Fix for issue #3: https://github.com/mnooner256/pyqrcode/issues/3#
-        #I was performing the terminate_bits() part in the encoding.
-        #As per the standard, terminating bits are only supposed to
-        #be added after the bit stream is complete. I took that to
-        #mean after the encoding, but actually it is after the entire
-        #bit stream has been constructed.
-        bits = self.terminate_bits(self.buffer.getvalue())
-        if bits is not None:
-            self.buffer.write(bits)
-
-        #delimit_words and add_words can return None
-        add_bits = self.delimit_words()
-        if add_bits:
-            self.buffer.write(add_bits)
-        
-        fill_bytes = self.add_words()
-        if fill_bytes:
-            self.buffer.write(fill_bytes)
-        
-        #Get a numeric representation of the data
-        data = [int(''.join(x),2)
-                    for x in self.grouper(8, self.buffer.getvalue())]
-
-        #This is the error information for the code
-        error_info = tables.eccwbi[self.version][self.error]
-
-        #This will hold our data blocks
-        data_blocks = []
-
-        #This will hold our error blocks
-        error_blocks = []
-
-        #Some codes have the data sliced into two different sized blocks
-        #for example, first two 14 word sized blocks, then four 15 word
-        #sized blocks. This means that slicing size can change over time.
-        data_block_sizes = [error_info[2]] * error_info[1]
-        if error_info[3] != 0:
-            data_block_sizes.extend([error_info[4]] * error_info[3])
-
-        #For every block of data, slice the data into the appropriate
-        #sized block
-        current_byte = 0
-        for n_data_blocks in data_block_sizes:
-            data_blocks.append(data[current_byte:current_byte+n_data_blocks])
-            current_byte += n_data_blocks
-        
-        #I am not sure about the test after the "and". This was added to
+        data = self.make_data_words()
+
+        #Get the (cached) block layout and error correction encoder
+        plan = reedsolomon.get_block_plan(self.version, self.error)
+
+        #I am not sure about this test. This was added to
         #fix a bug where after delimit_words padded the bit stream, a zero
         #byte ends up being added. After checking around, it seems this extra
         #byte is supposed to be chopped off, but I cannot find that in the
         #standard! I am adding it to solve the bug, I believe it is correct.
-        if current_byte < len(data):
+        if plan.data_words < len(data):
             raise ValueError('Too much data for this code version.')
 
-        #DEBUG CODE!!!!
-        #Print out the data blocks
-        #print('Data Blocks:\n{0}'.format(data_blocks))
-
-        #Calculate the error blocks
-        for n, block in enumerate(data_blocks):
-            error_blocks.append(self.make_error_block(block, n))
-
-        #DEBUG CODE!!!!
-        #Print out the error blocks
-        #print('Error Blocks:\n{0}'.format(error_blocks))
+        #Calculate the error blocks and write the buffer such that:
+        #block 1 byte 1, block 2 byte 1, etc. followed by the error
+        #blocks in the same order.
+        self.buffer = BitStream(plan.encode(data))
 
-        #Buffer we will write our data blocks into
-        data_buffer = io.StringIO()
-
-        #Add the data blocks
-        #Write the buffer such that: block 1 byte 1, block 2 byte 1, etc.
-        largest_block = max(error_info[2], error_info[4])+error_info[0]
-        for i in range(largest_block):
-            for block in data_blocks:
-                if i < len(block):
-                    data_buffer.write(self.binary_string(block[i], 8))
-
-        #Add the error code blocks.
-        #Write the buffer such that: block 1 byte 1, block 2 byte 2, etc.
-        for i in range(error_info[0]):
-            for block in error_blocks:
-                data_buffer.write(self.binary_string(block[i], 8))
+    def make_data_words(self):
+        """这个方法把数据编码到 `buffer` 比特流中，包含结束符和填充字节，
+        然后返回所有数据码字，是一个 `bytes` 字节对象。
+        """
+        #Encode the data into a QR code, each segment has its own mode
+        #indicator and data length field. A code with a single mode encodes
+        #the data attribute itself.
+        for mode, data in self.segments:
+            if mode == self.mode:
+                data = None
+            self.buffer.write(mode, 4)
+            self.buffer.write(*self.get_data_length(mode, data))
+            self.encode(self.buffer, mode, data)
 
-        self.buffer = data_buffer
+        #Fix for issue #3: https://github.com/mnooner256/pyqrcode/issues/3#
+        #I was performing the terminate_bits() part in the encoding.
+        #As per the standard, terminating bits are only supposed to
+        #be added after the bit stream is complete. I took that to
+        #mean after the encoding, but actually it is after the entire
+        #bit stream has been constructed.
+        self.terminate_bits(self.buffer)
+        self.delimit_words(self.buffer)
+        self.add_words(self.buffer)
+        
+        #Get a numeric representation of the data
+        return self.buffer.tobytes()
 
-    def terminate_bits(self, payload):
+    def terminate_bits(self, buf):
         """这个方法一些0增加到编码完的数据尾部，
         这样能保证编码完的数据是正确的长度。
-        返回含有加入的比特二进制字符串。
+        加入的比特会直接写入 `buf` 比特流中。
         """
         data_capacity = tables.data_capacity[self.version][self.error][0]
 
-        if len(payload) > data_capacity:
+        if len(buf) > data_capacity:
             raise ValueError('The supplied data will not fit '
                              'within this version of a QR code.')
 
         #We must add up to 4 zeros to make up for any shortfall in the
-        #length of the data field.
-        if len(payload) == data_capacity:
-            return None
-        elif len(payload) <= data_capacity-4:
-            bits = self.binary_string(0,4)
-        else:
-            #Make up any shortfall need with less than 4 zeros
-            bits = self.binary_string(0, data_capacity - len(payload))
-
-        return bits
-
-    def delimit_words(self):
-        """这个方法得到现有的编码完的二进制字符串后，
-        返回的二进制字符串会堆叠，
-        这样编码完的字符串就只含有完整的字节。
+        #length of the data field. Make up any shortfall need with less
+        #than 4 zeros.
+        buf.write(0, min(4, data_capacity - len(buf)))
+
+    def delimit_words(self, buf):
+        """这个方法得到现有的编码完的比特流后，
+        在比特流中堆叠一些0，
+        这样编码完的比特流就只含有完整的字节。
         """
-        bits_short = 8 - (len(self.buffer.getvalue()) % 8)
+        bits_short = 8 - (len(buf) % 8)
         
-        #The string already falls on an byte boundary do nothing
-        if bits_short == 0 or bits_short == 8:
-            return None
-        else:
-            return self.binary_string(0, bits_short)
+        #The stream already falls on an byte boundary do nothing
+        if bits_short != 8:
+            buf.write(0, bits_short)
 
-    def add_words(self):
+    def add_words(self, buf):
         """这个方法确保数据块必须填充整个二维码的数据容量。
         如果缺少数据，我们必须在编码完的数据区域尾部增加字节。
         增加的这些字节都按照二维码标准来描述。
         """
 
-        data_blocks = len(self.buffer.getvalue()) // 8
+        data_blocks = len(buf) // 8
         total_blocks = tables.data_capacity[self.version][self.error][0] // 8
         needed_blocks = total_blocks - data_blocks
 
-        if needed_blocks == 0:
-            return None
-
-        #This will return item1, item2, item1, item2, etc.
-        block = itertools.cycle(['11101100', '00010001'])
-
-        #Create a string of the needed blocks
-        return ''.join([next(block) for x in range(needed_blocks)])
-
-    def make_error_block(self, block, block_number):
-        """这个方法建立了给出的数据块的错误纠正数据块。
-        这是*非常复杂*的过程。
-        要理解这里的代码你需要阅读如下网址提供的内容：
-
-        * http://www.thonky.com/qr-code-tutorial/part-2-error-correction/
-        * http://www.matchadesign.com/blog/qr-code-demystified-part-4/
-        """
-        #Get the error information from the standards table
-        error_info = tables.eccwbi[self.version][self.error]
-
-        #This is the number of 8-bit words per block
-        if block_number < error_info[1]:
-            code_words_per_block = error_info[2]
-        else:
-            code_words_per_block = error_info[4]
-
-        #This is the size of the error block
-        error_block_size = error_info[0]
-
-        #Copy the block as the message polynomial coefficients
-        mp_co = block[:]
-
-        #Add the error blocks to the message polynomial
-        mp_co.extend([0] * (error_block_size))
-
-        #Get the generator polynomial
-        generator = tables.generator_polynomials[error_block_size]
+        #This will write 0xEC, 0x11, 0xEC, 0x11, etc.
+        buf.write_bytes(b'\xec\x11' * (needed_blocks // 2) +
+                        b'\xec' * (needed_blocks % 2))
 
-        #This will hold the temporary sum of the message coefficient and the
-        #generator polynomial
-        gen_result = [0] * len(generator)
-
-        #Go through every code word in the block
-        for i in range(code_words_per_block):
-            #Get the first coefficient from the message polynomial
-            coefficient = mp_co.pop(0)
-
-            #Skip coefficients that are zero
-            if coefficient == 0:
-                continue
-            else:
-                #Turn the coefficient into an alpha exponent
-                alpha_exp = tables.galois_antilog[coefficient]
-
-            #Add the alpha to the generator polynomial
-            for n in range(len(generator)):
-                gen_result[n] = alpha_exp + generator[n]
-                if gen_result[n] > 255:
-                    gen_result[n] = gen_result[n] % 255
+    def make_code(self):
+        """这个方法返回最可能该有的二维码。"""
+        template = self.make_template()
 
-                #Convert the alpha notation back into coefficients
-                gen_result[n] = tables.galois_log[gen_result[n]]
+        #Create the various types of masks of the template
+        self.mask_bits = self.make_masks(template)
 
-                #XOR the sum with the message coefficients
-                mp_co[n] = gen_result[n] ^ mp_co[n]
+        self.best_mask = self.choose_best_mask()
+        self.code = Matrix.from_int(self.mask_bits[self.best_mask],
+                                    len(template))
 
-        #Pad the end of the error blocks with zeros if needed
-        if len(mp_co) < code_words_per_block:
-            mp_co.extend([0] * (code_words_per_block - len(mp_co)))
+    @property
+    def masks(self):
+        """所有8种遮罩，是一个 :class:`Matrix` 矩阵的列表。
 
-        return mp_co
+        遮罩都以紧凑的整数形式保存在 `mask_bits` 属性中，
+        每次访问这个属性都会建立新的矩阵。
+        """
+        size = tables.version_size[self.version]
+        return [Matrix.from_int(bits, size) for bits in self.mask_bits]
 
-    def make_code(self):
-        """这个方法返回最可能该有的二维码。"""
-        from copy import deepcopy
+    def make_template(self):
+        """这个方法返回建立二维码用的模板矩阵，
+        其中含有所有必须的模式，类型信息区域已经预留好了。
 
-        #Get the size of the underlying matrix
-        matrix_size = tables.version_size[self.version]
+        模板只依赖二维码的版本号，所以会按照版本号缓存起来。
+        不要修改返回的模板矩阵，而是要先复制一份。
+        """
+        template = _templates.get(self.version)
+        if template is None:
+            #Get the size of the underlying matrix
+            matrix_size = tables.version_size[self.version]
 
-        #Create a template matrix we will build the codes with
-        row = [' ' for x in range(matrix_size)]
-        template = [deepcopy(row) for x in range(matrix_size)]
+            #Create a template matrix we will build the codes with
+            template = Matrix.blank(matrix_size, _UNSET)
 
-        #Add mandatory information to the template
-        self.add_detection_pattern(template)
-        self.add_position_pattern(template)
-        self.add_version_pattern(template)
+            #Add mandatory information to the template
+            self.add_detection_pattern(template)
+            self.add_position_pattern(template)
+            self.add_version_pattern(template)
 
-        #Create the various types of masks of the template
-        self.masks = self.make_masks(template)
+            #Reserve the type pattern area so the data skips it, the
+            #actual bits depend on the mask and are added to each mask
+            self.add_type_pattern(template, '0' * len(_type_positions))
 
-        self.best_mask = self.choose_best_mask()
-        self.code = self.masks[self.best_mask]
+            _templates[self.version] = template
+        return template
 
     def add_detection_pattern(self, m):
         """这个方法为二维码增加了检查模式。
@@ -564,7 +718,7 @@ class QRCodeBuilder:
         #in the lower right corner, this removes it.
         for i in range(-8, 0):
             for j in range(-8, 0):
-                m[i][j] = ' '
+                m[i][j] = _UNSET
 
         #Add the timing pattern
         bit = itertools.cycle([1,0])
@@ -653,249 +807,1030 @@ class QRCodeBuilder:
                 m[j][i] = bit
 
     def make_masks(self, template):
-        """这个方法生产所有7种遮罩，
+        """这个方法生产所有8种遮罩，
         所以能够确定最好的遮罩。
         其中 `template` 参数是一个二维码矩阵，
         该矩阵是所有生成的遮罩的基础服务。
+
+        数据只会放置一次，形成一个没有遮罩的矩阵。
+        每种遮罩都是这个矩阵与缓存的遮罩比特图做异或运算得到的，
+        遮罩比特图只覆盖数据区域。
+        返回的遮罩都是按行排列的整数，阅读 :py:meth:`Matrix.to_int` 方法。
+        同样遮罩按列排列的整数会保存在 `mask_columns` 属性中，
+        用来计算惩罚分。
         """
-        from copy import deepcopy
+        order, source = _get_placement(self.version, template)
+
+        #The data modules are gathered from the bit stream in placement
+        #order, every other module comes from the template. Some versions
+        #don't have enough bits. You then fill in the rest of the pattern
+        #with 0's. These are called "remainder bits."
+        stream = bytearray(b''.join([_byte_ascii[b] for b in
+                                     bytearray(self.buffer.tobytes())]))
+        del stream[len(self.buffer):]
+        source = stream + source[len(stream):]
+        unmasked = _ascii_to_int(bytearray(map(source.__getitem__, order)))
+
+        masks = []
+        for n, bitmap in enumerate(_get_mask_bitmaps(self.version, template)):
+            #Flip the data bits wherever the mask pattern is True, then
+            #add the type pattern bits to the code
+            masks.append((unmasked ^ bitmap) |
+                         _get_type_bits(self.version, self.error, n))
+
+        #The penalty rules also look at the columns. Transposing commutes
+        #with the XOR and OR above, so the unmasked matrix is transposed
+        #once and combined with the (cached) transposed bitmaps.
+        columns = _transpose_bits(unmasked, len(template))
+        bitmaps = _get_column_bitmaps(self.version, template)
+        self.mask_columns = [(columns ^ bitmap) |
+                             _get_type_columns(self.version, self.error, n)
+                             for n, bitmap in enumerate(bitmaps)]
 
-        nmasks = len(tables.mask_patterns)
-        masks = [''] * nmasks
-        count = 0
+        return masks
 
-        for n in range(nmasks):
-            cur_mask = deepcopy(template)
-            masks[n] = cur_mask
+    def choose_best_mask(self):
+        """这个方法返回 "最好的" 遮罩的索引位，
+        作为定义中拥有最低的合计惩罚分。
+        惩罚规则都定义在二维码标准中。
+        遮罩所含的最低合计分应该是被二维码视觉扫描器最容易读取的。
 
-            #Add the type pattern bits to the code
-            self.add_type_pattern(cur_mask, tables.type_bits[self.error][n])
+        遮罩由 `mask_strategy` 属性所描述的策略来选择，
+        每种遮罩的4项惩罚分都保存在 `scores` 属性中，
+        没有计算完的遮罩惩罚分是 `None` 值。
+        """
+        strategy = self.mask_strategy
 
-            #Get the mask pattern
-            pattern = tables.mask_patterns[n]
+        if isinstance(strategy, int):
+            #The caller forced the mask, there is nothing to score
+            self.scores = [None] * len(self.mask_bits)
+            return strategy
 
-            #This will read the 1's and 0's one at a time
-            bits = iter(self.buffer.getvalue())
+        if not callable(strategy):
+            strategy = _mask_strategies[strategy]
 
-            #These will help us do the up, down, up, down pattern
-            row_start = itertools.cycle([len(cur_mask)-1, 0])
-            row_stop = itertools.cycle([-1,len(cur_mask)])
-            direction = itertools.cycle([-1, 1])
+        best = strategy(self)
+        if best not in range(len(self.mask_bits)):
+            raise ValueError('The mask strategy chose an illegal '
+                             'mask {0}.'.format(best))
+        return best
 
-            #The data pattern is added using pairs of columns
-            for column in range(len(cur_mask)-1, 0, -2):
+    def add_type_pattern(self, m, type_bits):
+        """这个方法把模式增加到二维码中，
+        表示错误纠正级别和产生二维码所用的遮罩类型。
+        """
+        for bit, positions in zip(type_bits, _type_positions):
+            for row, col in positions:
+                m[row][col] = int(bit)
 
-                #The vertical timing pattern is an exception to the rules,
-                #move the column counter over by one
-                if column <= 6:
-                    column = column - 1
 
-                #This will let us fill in the pattern
-                #right-left, right-left, etc.
-                column_pair = itertools.cycle([column, column-1])
+def _get_scoring(scoring):
+    """这个函数检查 *scoring* 参数是合法的后端，然后返回实际使用的后端名称。
+    阅读 :py:class:`QRCodeBuilder` 了解参数的信息。
+    """
+    if scoring is None:
+        scoring = default_scoring
+    if scoring not in _scorers:
+        raise ValueError('{0} is not a valid scoring '
+                         'backend.'.format(scoring))
 
-                #Go through each row in the pattern moving up, then down
-                for row in range(next(row_start), next(row_stop),
-                                 next(direction)):
+    #Fall back on the pure Python scorer if NumPy is not installed
+    if scoring == 'numpy' and _get_numpy() is None:
+        scoring = 'python'
+    return scoring
 
-                    #Fill in the right then left column
-                    for i in range(2):
-                        col = next(column_pair)
 
-                        #Go to the next column if we encounter a
-                        #preexisting pattern (usually an alignment pattern)
-                        if cur_mask[row][col] != ' ':
-                            continue
+def _get_mask_strategy(mask):
+    """这个函数检查 *mask* 参数是合法的遮罩选择策略，然后返回这个策略。
+    阅读 :py:class:`QRCodeBuilder` 了解参数的信息。
+    """
+    if mask is None:
+        mask = 'exhaustive'
+    if isinstance(mask, int):
+        if not 0 <= mask < len(tables.mask_patterns):
+            raise ValueError('Illegal mask {0}, mask must be between '
+                             '0 and 7.'.format(mask))
+    elif not callable(mask) and mask not in _mask_strategies:
+        raise ValueError('{0} is not a valid mask strategy.'.format(mask))
+    return mask
+
+
+def _get_length_bits(version, mode):
+    """这个函数返回 *version* 版本号的二维码中，
+    *mode* 模式编号的"数据长度"区域的比特宽度。
+    """
+    #The "data length" field varies by the type of code and its mode.
+    #discover how long the "data length" field should be.
+    if 1 <= version <= 9:
+        max_version = 9
+    elif 10 <= version <= 26:
+        max_version = 26
+    else:
+        max_version = 40
 
-                        #Some versions don't have enough bits. You then fill
-                        #in the rest of the pattern with 0's. These are
-                        #called "remainder bits."
-                        try:
-                            bit = int(next(bits))
-                        except:
-                            bit = 0
+    return tables.data_length_field[max_version][mode]
 
 
-                        #If the pattern is True then flip the bit
-                        if pattern(row, col):
-                            cur_mask[row][col] = bit ^ 1
-                        else:
-                            cur_mask[row][col] = bit
+def _get_bit_length(data, version, mode):
+    """这个函数返回 *data* 数据用 *mode* 模式编号编码后的比特数，
+    包含模式指示符和数据长度区域，不包含结束符和填充字节。
+    不需要真的编码数据，所以计算量很小。
+    """
+    if mode == tables.modes['kanji']:
+        length = len(data) // 2
+    else:
+        length = len(data)
+
+    if mode == tables.modes['numeric']:
+        bits = 10 * (length // 3) + (0, 4, 7)[length % 3]
+    elif mode == tables.modes['alphanumeric']:
+        bits = 11 * (length // 2) + 6 * (length % 2)
+    elif mode == tables.modes['kanji']:
+        bits = 13 * length
+    else:
+        bits = 8 * length
 
-        #DEBUG CODE!!!
-        #Save all of the masks as png files
-        #for i, m in enumerate(masks):
-        #    _png(m, self.version, 'mask-{0}.png'.format(i), 5)
+    return 4 + _get_length_bits(version, mode) + bits
 
-        return masks
 
-    def choose_best_mask(self):
-        """这个方法返回 "最好的" 遮罩的索引位，
-        作为定义中拥有最低的合计惩罚分。
-        惩罚规则都定义在二维码标准中。
-        遮罩所含的最低合计分应该是被二维码视觉扫描器最容易读取的。
-        """
-        self.scores = []
-        for n in range(len(self.masks)):
-            self.scores.append([0,0,0,0])
-
-        #Score penalty rule number 1
-        #Look for five consecutive squares with the same color.
-        #Each one found gets a penalty of 3 + 1 for every
-        #same color square after the first five in the row.
-        for (n, mask) in enumerate(self.masks):
-            current = mask[0][0]
-            counter = 0
-            total = 0
-
-            #Examine the mask row wise
-            for row in range(0,len(mask)):
-                counter = 0
-                for col  in range(0,len(mask)):
-                    bit = mask[row][col]
-
-                    if bit == current:
-                        counter += 1
-                    else:
-                        if counter >= 5:
-                            total += (counter - 5) + 3
-                        counter = 1
-                        current = bit
-                if counter >= 5:
-                    total += (counter - 5) + 3
-
-            #Examine the mask column wise
-            for col in range(0,len(mask)):
-                counter = 0
-                for row in range(0,len(mask)):
-                    bit = mask[row][col]
-
-                    if bit == current:
-                        counter += 1
-                    else:
-                        if counter >= 5:
-                            total += (counter - 5) + 3
-                        counter = 1
-                        current = bit
-                if counter >= 5:
-                    total += (counter - 5) + 3
-
-            self.scores[n][0] = total
-
-        #Score penalty rule 2
-        #This rule will add 3 to the score for each 2x2 block of the same
-        #colored pixels there are.
-        for (n, mask) in enumerate(self.masks):
-            count = 0
-            #Don't examine the 0th and Nth row/column
-            for i in range(0, len(mask)-1):
-                for j in range(0, len(mask)-1):
-                    if mask[i][j] == mask[i+1][j]   and \
-                       mask[i][j] == mask[i][j+1]   and \
-                       mask[i][j] == mask[i+1][j+1]:
-                        count += 1
-
-            self.scores[n][1] = count * 3
-
-        #Score penalty rule 3
-        #This rule looks for 1011101 within the mask prefixed
-        #and/or suffixed by four zeros.
-        patterns = [[0,0,0,0,1,0,1,1,1,0,1],
-                    [1,0,1,1,1,0,1,0,0,0,0],]
-                    #[0,0,0,0,1,0,1,1,1,0,1,0,0,0,0]]
-
-        for (n, mask) in enumerate(self.masks):
-            nmatches = 0
-
-            for i in range(len(mask)):
-                for j in range(len(mask)):
-                    for pattern in patterns:
-                        match = True
-                        k = j
-                        #Look for row matches
-                        for p in pattern:
-                            if k >= len(mask) or mask[i][k] != p:
-                                match = False
-                                break
-                            k += 1
-                        if match:
-                            nmatches += 1
-
-                        match = True
-                        k = j
-                        #Look for column matches
-                        for p in pattern:
-                            if k >= len(mask) or mask[k][i] != p:
-                                match = False
-                                break
-                            k += 1
-                        if match:
-                            nmatches += 1
-
-
-            self.scores[n][2] = nmatches * 40
-
-        #Score the last rule, penalty rule 4. This rule measures how close
-        #the pattern is to being 50% black. The further it deviates from
-        #this this ideal the higher the penalty.
-        for (n, mask) in enumerate(self.masks):
-            nblack = 0
-            for row in mask:
-                nblack += sum(row)
-
-            total_pixels = len(mask)**2
-            ratio = nblack / total_pixels
-            percent = (ratio * 100) - 50
-            self.scores[n][3] = int((abs(int(percent)) / 5) * 10)
-
-
-        #Calculate the total for each score
-        totals = [0] * len(self.scores)
-        for i in range(len(self.scores)):
-            for j in range(len(self.scores[i])):
-                totals[i] +=  self.scores[i][j]
-
-        #DEBUG CODE!!!
-        #Prints out a table of scores
-        #print('Rule Scores\n      1     2     3     4    Total')
-        #for i in range(len(self.scores)):
-        #    print(i, end='')
-        #    for s in self.scores[i]:
-        #        print('{0: >6}'.format(s), end='')
-        #    print('{0: >7}'.format(totals[i]))
-        #print('Mask Chosen: {0}'.format(totals.index(min(totals))))
-
-        #The lowest total wins
-        return totals.index(min(totals))
+#: The characters that can be encoded in numeric mode.
+_numeric_characters = frozenset('0123456789')
 
-    def add_type_pattern(self, m, type_bits):
-        """这个方法把模式增加到二维码中，
-        表示错误纠正级别和产生二维码所用的遮罩类型。
-        """
-        field = iter(type_bits)
-        for i in range(7):
-            bit = int(next(field))
+#: The characters that can be encoded in alphanumeric mode.
+_alphanumeric_characters = frozenset(tables.ascii_codes)
 
-            #Skip the timing bits
-            if i < 6:
-                m[8][i] = bit
-            else:
-                m[8][i+1] = bit
+#: The characters that can be encoded in kanji mode, see
+#: :func:`_get_kanji_characters`.
+_kanji_characters = None
+
+
+def _get_kanji_characters():
+    """这个函数返回所有能用 kanji 模式编码的字符的集合。
+    也就是 Shift JIS 编码是两个字节，
+    并且在 0x8140 到 0x9FFC 或 0xE040 到 0xEBBF 范围内的字符。
+    集合第一次用到时才会建立。
+    """
+    global _kanji_characters
+    if _kanji_characters is None:
+        characters = set()
+        for first, last in ((0x8140, 0x9FFC), (0xE040, 0xEBBF)):
+            for asint in range(first, last + 1):
+                code = bytes(bytearray((asint >> 8, asint & 0xFF)))
+                char = code.decode('shiftjis', 'ignore')
+
+                #Skip undefined codes and codes that do not round trip
+                if len(char) == 1 and \
+                   char.encode('shiftjis', 'ignore') == code:
+                    characters.add(char)
+        _kanji_characters = frozenset(characters)
+    return _kanji_characters
+
+
+#: The versions sharing the same "data length" field sizes.
+_version_ranges = ((1, 9), (10, 26), (27, 40))
+
+#: Cache of the number of data bits in each version, keyed by the error
+#: level. The list is indexed by the version, index 0 is unused.
+_capacity_index = {}
+
+
+def _get_capacity_index(error):
+    """这个函数返回一个列表，含有 *error* 错误纠正级别下每个版本号的数据比特数，
+    列表的索引位就是版本号。数据比特数随着版本号递增，所以可以二分查找。
+    """
+    index = _capacity_index.get(error)
+    if index is None:
+        index = [0] + [tables.data_capacity[version][error][0]
+                       for version in range(1, 41)]
+        _capacity_index[error] = index
+    return index
+
+
+def _pick_version(data, mode, error):
+    """这个函数返回能放下 *data* 数据的最小版本号，
+    其中 *mode* 参数是模式编号，*error* 参数是错误纠正级别。
 
-            if -8 < -(i+1):
-                m[-(i+1)][8] = bit
+    使用的是数据编码后确切的比特数，阅读 :func:`_get_bit_length` 函数。
+    "数据长度"区域的宽度在版本号9和26之后会变大，
+    所以在每一段版本号范围内分别做二分查找。
+    """
+    capacity = _get_capacity_index(error)
+
+    if mode == tables.modes['kanji']:
+        length = len(data) // 2
+    else:
+        length = len(data)
+
+    for first, last in _version_ranges:
+        #The length itself must fit in the "data length" field
+        if length >= 1 << _get_length_bits(first, mode):
+            continue
 
-        for i in range(-8,0):
-            bit = int(next(field))
+        bits = _get_bit_length(data, first, mode)
+        version = bisect.bisect_left(capacity, bits, first, last + 1)
+        if version <= last:
+            return version
 
-            m[8][i] = bit
+    raise ValueError('The data will not fit in any QR code version '
+                     'with the given encoding and error level.')
+
+
+def _get_segments_bit_length(segments, version):
+    """这个函数返回多个数据段编码后的比特数，
+    其中 *segments* 参数是一个 (模式编号, 数据) 元组的列表。
+    阅读 :func:`_get_bit_length` 函数。
+    """
+    return sum(_get_bit_length(data, version, mode)
+               for mode, data in segments)
 
-            i = -i
-            #Skip timing column
-            if i > 6:
-                m[i][8] = bit
+
+def _make_segments(text, version, encoding):
+    """这个函数把 *text* 文本分成多个数据段，每个数据段使用一种编码模式，
+    让所有数据段编码后的比特数最少。
+    返回一个 (模式名称, 数据) 元组的列表，可以直接传给 'mixed' 模式的
+    :py:class:`QRCodeBuilder` 类。
+
+    "数据长度"区域的宽度依赖 *version* 版本号，
+    8比特模式的数据段使用 *encoding* 参数编码成字节。
+    如果有字符不能用任何一种模式编码，会抛出 `ValueError` 异常。
+
+    这里用的是动态规划：对于每个字符和每种模式，
+    记录以该模式编码到这个字符为止的最少比特数（以1/6比特为单位，
+    这样数字模式和字母数字组合模式每个字符的比特数都是整数）。
+    """
+    modes = ('numeric', 'alphanumeric', 'binary', 'kanji')
+    kanji = _get_kanji_characters()
+
+    #The mode indicator and data length field of a new segment
+    head_costs = [(4 + _get_length_bits(version, tables.modes[mode])) * 6
+                  for mode in modes]
+
+    #The best cost so far in each mode, a new segment is already paid for
+    costs = list(head_costs)
+    char_modes = []
+    byte_costs = {}
+    for char in text:
+        #The cost of the character in each mode, None if it cannot be
+        #encoded in that mode
+        byte_cost = byte_costs.get(char)
+        if byte_cost is None:
+            byte_cost = 48 * len(char.encode(encoding, 'ignore')) or False
+            byte_costs[char] = byte_cost
+        char_costs = (20 if char in _numeric_characters else None,
+                      33 if char in _alphanumeric_characters else None,
+                      byte_cost or None,
+                      78 if char in kanji else None)
+
+        if char_costs == (None, None, None, None):
+            raise ValueError('The character {0!r} cannot be encoded in any '
+                             'mode.'.format(char))
+
+        #Stay in the same mode
+        current = [None] * 4
+        previous = [None] * 4
+        for m, cost in enumerate(char_costs):
+            if cost is not None:
+                current[m] = costs[m] + cost
+                previous[m] = m
+
+        #Or end the segment here and start a new one for the next character,
+        #the finished segment is rounded up to whole bits
+        for m in range(4):
+            for k in range(4):
+                if current[k] is None:
+                    continue
+                cost = (current[k] + 5) // 6 * 6 + head_costs[m]
+                if current[m] is None or cost < current[m]:
+                    current[m] = cost
+                    previous[m] = k
+
+        costs = current
+        char_modes.append(previous)
+
+    if not char_modes:
+        return []
+
+    #Walk back from the cheapest final mode to find the mode of every
+    #character
+    mode = costs.index(min(cost for cost in costs if cost is not None))
+    chosen = []
+    for previous in reversed(char_modes):
+        mode = previous[mode]
+        chosen.append(mode)
+    chosen.reverse()
+
+    #Join the characters into segments
+    segments = []
+    for mode, group in itertools.groupby(zip(chosen, text),
+                                         operator.itemgetter(0)):
+        data = ''.join(char for _, char in group)
+        if modes[mode] == 'binary':
+            data = data.encode(encoding)
+        elif modes[mode] == 'kanji':
+            data = data.encode('shiftjis')
+        segments.append((modes[mode], data))
+    return segments
+
+
+def _fit_segments(segments, error, first, last):
+    """这个函数返回从 *first* 到 *last* 的版本号中，
+    能放下 *segments* 数据段的最小版本号，如果都放不下就返回 `None` 值。
+    其中 *segments* 参数是一个 (模式名称, 数据) 元组的列表，
+    所有这些版本号的"数据长度"区域宽度必须一样。
+    """
+    bits = 0
+    for mode, data in segments:
+        mode = tables.modes[mode]
+
+        #The length of each segment must fit in its "data length" field
+        length = len(data) // 2 if mode == tables.modes['kanji'] \
+                 else len(data)
+        if length >= 1 << _get_length_bits(first, mode):
+            return None
+
+        bits += _get_bit_length(data, first, mode)
+
+    found = bisect.bisect_left(_get_capacity_index(error), bits,
+                               first, last + 1)
+    return found if found <= last else None
+
+
+def _pick_segments(text, error, encoding, version=None):
+    """这个函数返回一个元组，含有能放下 *text* 文本的最小版本号，
+    以及 :func:`_make_segments` 函数为这个版本号分好的数据段。
+    如果描述了 *version* 参数，只检查这个版本号能否放下数据。
+    """
+    for first, last in _version_ranges:
+        if version is not None:
+            if not first <= version <= last:
+                continue
+            first = last = version
+
+        segments = _make_segments(text, first, encoding)
+        found = _fit_segments(segments, error, first, last)
+        if found is not None:
+            return found, segments
+
+    raise ValueError('The data will not fit in any QR code version '
+                     'with the given encoding and error level.')
+
+
+def _pick_segments_version(segments, error):
+    """这个函数返回能放下 *segments* 数据段的最小版本号，
+    其中 *segments* 参数是一个 (模式名称, 数据) 元组的列表。
+    """
+    for first, last in _version_ranges:
+        found = _fit_segments(segments, error, first, last)
+        if found is not None:
+            return found
+
+    raise ValueError('The data will not fit in any QR code version '
+                     'with the given error level.')
+
+
+def _make_type_positions():
+    """这个函数返回类型信息中每个比特在二维码里的两个位置。
+    负数坐标是从矩阵的底部或右边开始数的，这样位置与版本号无关。
+    """
+    positions = []
+    for i in range(7):
+        #Skip the timing bits
+        if i < 6:
+            positions.append(((8, i), (-(i+1), 8)))
+        else:
+            positions.append(((8, i+1), (-(i+1), 8)))
+
+    for i in range(-8, 0):
+        #Skip timing column
+        if -i > 6:
+            positions.append(((8, i), (-i, 8)))
+        else:
+            positions.append(((8, i), (-i-1, 8)))
+    return positions
+
+#: The positions of the type information bits, see _make_type_positions
+_type_positions = _make_type_positions()
+
+#: Cache of the type information overlays, keyed by (error, mask).
+_type_overlays = {}
+
+
+def _get_type_overlay(error, mask):
+    """这个函数返回一个元组，其中含有 (行, 列, 比特) 元组，
+    表示 *error* 错误纠正级别和 *mask* 遮罩的类型信息。
+    """
+    overlay = _type_overlays.get((error, mask))
+    if overlay is None:
+        overlay = tuple((row, col, int(bit)) for bit, positions in
+                        zip(tables.type_bits[error][mask], _type_positions)
+                        for row, col in positions)
+        _type_overlays[(error, mask)] = overlay
+    return overlay
+
+#: Cache of the template matrices, keyed by the QR code's version.
+_templates = {}
+
+#: Cache of the data module coordinates, keyed by the QR code's version.
+_data_positions = {}
+
+
+def _get_data_positions(version, template):
+    """这个函数返回一个元组，其中两个元素分别是所有数据块的行坐标和列坐标，
+    按照数据的放置顺序排列，都是紧凑的 `array` 阵列。
+    数据块就是 `template` 矩阵中还没有设置的数据块。
+
+    数据是使用成对的列，以上、下、上、下的锯齿形式放置的，
+    遇到已经存在的模式就跳过。这个顺序只依赖二维码的版本号，
+    所以坐标会按照版本号缓存起来，放置数据只需要一次线性的分散写入。
+    """
+    positions = _data_positions.get(version)
+    if positions is None:
+        size = len(template)
+        rows = array.array('B')
+        cols = array.array('B')
+
+        #These will help us do the up, down, up, down pattern
+        upward = True
+
+        #The data pattern is added using pairs of columns
+        for column in range(size-1, 0, -2):
+
+            #The vertical timing pattern is an exception to the rules,
+            #move the column counter over by one
+            if column <= 6:
+                column = column - 1
+
+            #Go through each row in the pattern moving up, then down
+            for row in (range(size-1, -1, -1) if upward else range(size)):
+
+                #Fill in the right then left column
+                for col in (column, column-1):
+
+                    #Go to the next column if we encounter a
+                    #preexisting pattern (usually an alignment pattern)
+                    if template[row][col] == _UNSET:
+                        rows.append(row)
+                        cols.append(col)
+            upward = not upward
+
+        positions = _data_positions[version] = (rows, cols)
+    return positions
+
+
+#: Cache of the data placement, keyed by the QR code's version.
+_placements = {}
+
+
+def _get_placement(version, template):
+    """这个函数返回一个元组，其中两个元素用来把数据放置到 `template` 矩阵中。
+
+    第一个元素是一个 `array` 阵列，对于矩阵中按行排列的每个数据块，
+    描述了这个数据块在第二个元素中的索引位。
+    第二个元素是一个由 '0' 和 '1' 组成的 `bytes` 字节，
+    开头是所有数据块（全部是0，要用比特流覆盖），然后是整个模板矩阵。
+    这样放置数据就只是一次收集运算。
+    """
+    placement = _placements.get(version)
+    if placement is None:
+        size = len(template)
+        rows, cols = _get_data_positions(version, template)
+        ndata = len(rows)
+        order = array.array('H', range(ndata, ndata + size * size))
+        for k, (row, col) in enumerate(zip(rows, cols)):
+            order[row * size + col] = k
+        source = b'0' * ndata + \
+                 bytes(bytearray().join(template).translate(_bits_to_ascii))
+        placement = _placements[version] = (order, source)
+    return placement
+
+
+#: Cache of the mask bitmaps, keyed by the QR code's version.
+_mask_bitmaps = {}
+
+
+def _get_mask_bitmaps(version, template):
+    """这个函数返回一个列表，其中含有所有8种遮罩模式的比特图。
+    每个比特图都是按行排列的整数，1表示一个数据块在这种遮罩下要翻转。
+    比特图只覆盖数据区域，也就是 `template` 矩阵中还没有设置的数据块，
+    所以比特图可以直接和矩阵做异或运算。
+
+    数据区域只依赖二维码的版本号，所以比特图会按照版本号缓存起来。
+    """
+    bitmaps = _mask_bitmaps.get(version)
+    if bitmaps is None:
+        size = len(template)
+        rows, cols = _get_data_positions(version, template)
+        bitmaps = []
+        for pattern in tables.mask_patterns:
+            flat = bytearray(b'0') * (size * size)
+            for row, col in zip(rows, cols):
+                if pattern(row, col):
+                    flat[row * size + col] = ord('1')
+            bitmaps.append(_ascii_to_int(flat))
+        _mask_bitmaps[version] = bitmaps
+    return bitmaps
+
+
+#: Cache of the type information bits, keyed by (version, error, mask).
+_type_bits = {}
+
+
+def _get_type_bits(version, error, mask):
+    """这个函数把 :func:`_get_type_overlay` 的类型信息
+    返回成 *version* 版本号的按行排列的整数。
+    """
+    key = (version, error, mask)
+    bits = _type_bits.get(key)
+    if bits is None:
+        size = tables.version_size[version]
+        last = size * size - 1
+        bits = 0
+        for row, col, bit in _get_type_overlay(error, mask):
+            if bit:
+                bits |= 1 << (last - (row % size) * size - (col % size))
+        _type_bits[key] = bits
+    return bits
+
+
+def _transpose_bits(value, size):
+    """这个函数把一个按行排列的整数转换成按列排列的整数，
+    也就是转置后矩阵的按行排列的整数。
+    """
+    flat = '{0:0{1}b}'.format(value, size * size)
+    return int(''.join([flat[col::size] for col in range(size)]), 2)
+
+
+#: Cache of the transposed mask bitmaps, keyed by the QR code's version.
+_column_bitmaps = {}
+
+
+def _get_column_bitmaps(version, template):
+    """这个函数返回 :func:`_get_mask_bitmaps` 函数的比特图，
+    只是比特图都是按列排列的整数。
+    """
+    bitmaps = _column_bitmaps.get(version)
+    if bitmaps is None:
+        bitmaps = [_transpose_bits(bitmap, len(template))
+                   for bitmap in _get_mask_bitmaps(version, template)]
+        _column_bitmaps[version] = bitmaps
+    return bitmaps
+
+
+#: Cache of the transposed type information bits, keyed by
+#: (version, error, mask).
+_type_columns = {}
+
+
+def _get_type_columns(version, error, mask):
+    """这个函数返回 :func:`_get_type_bits` 函数的类型信息，
+    只是类型信息是按列排列的整数。
+    """
+    key = (version, error, mask)
+    bits = _type_columns.get(key)
+    if bits is None:
+        bits = _transpose_bits(_get_type_bits(version, error, mask),
+                               tables.version_size[version])
+        _type_columns[key] = bits
+    return bits
+
+
+#Count the 1 bits in an integer, int.bit_count is only in Python 3.10+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+#: Cache of the bit masks used by the penalty rules, keyed by the size.
+_penalty_masks = {}
+
+
+def _get_penalty_masks(size):
+    """这个函数返回一个元组，含有两个按行排列的整数。
+    第一个整数标记了所有不在第一列的数据块，
+    第二个整数标记了所有列号至少是10的数据块。
+    也就是在同一行中，能作为长度2和长度11的窗口结尾的数据块。
+    """
+    masks = _penalty_masks.get(size)
+    if masks is None:
+        #A 1 in the last column of every row
+        columns = int(('0' * (size - 1) + '1') * size, 2)
+        masks = (((1 << (size - 1)) - 1) * columns,
+                 ((1 << (size - 10)) - 1) * columns)
+        _penalty_masks[size] = masks
+    return masks
+
+
+def _same_pairs(bits, size):
+    """这个函数返回一个按行排列的整数，标记了所有和左边的数据块颜色相同的数据块，
+    其中 `bits` 参数是一个按行排列的整数。
+
+    整数中高位的比特是矩阵中前面的数据块，
+    所以右移 k 位后，每个数据块位置上的比特就是它前面的第 k 个数据块。
+    """
+    return ~(bits ^ (bits >> 1)) & _get_penalty_masks(size)[0]
+
+
+def _rule1_rows(same):
+    """这个函数返回按行计算的惩罚规则1的分数，
+    其中 `same` 参数是 :func:`_same_pairs` 函数的返回值。
+    """
+    #A run of 5 or more modules is 4 or more same color pairs. Every
+    #module ending a run of at least 5 costs 1 and the start of each
+    #run costs 2 more, a run of length L costs 3 + (L - 5).
+    runs = same & (same >> 1) & (same >> 2) & (same >> 3)
+    return _popcount(runs) + 2 * _popcount(runs & ~(runs >> 1))
+
+
+def _rule3_rows(bits, size):
+    """这个函数返回按行计算的惩罚规则3的匹配个数，
+    其中 `bits` 参数是一个按行排列的整数。
+    """
+    windows = _get_penalty_masks(size)[1]
+
+    #Look for 1011101 prefixed or suffixed by four zeros, windows
+    #running past the start of a row are masked out.
+    core = (bits & (bits >> 2) & (bits >> 3) & (bits >> 4) & (bits >> 6) &
+            ~((bits >> 1) | (bits >> 5)))
+    zeros = ~(bits | (bits >> 1) | (bits >> 2) | (bits >> 3))
+    return _popcount(core & (zeros >> 7) & windows) + \
+           _popcount((core >> 4) & zeros & windows)
+
+
+def _penalty_terms(bits, columns, size):
+    """这个生成器函数逐项产生一个遮罩的惩罚分，
+    每次产生一个元组，含有惩罚规则的索引位（0到3）和该规则的分数。
+    计算量小的规则会先产生，这样调用者可以提前停止计算。
+    参数与 :func:`_penalty_scores` 函数一样。
+
+    惩罚规则都是用整数的移位和位运算一次性计算完整个矩阵的，
+    而不是逐个数据块来检查。
+    """
+    #Score the last rule, penalty rule 4. This rule measures how close
+    #the pattern is to being 50% black. The further it deviates from
+    #this this ideal the higher the penalty.
+    ratio = _popcount(bits) / (size * size)
+    percent = (ratio * 100) - 50
+    yield 3, int((abs(int(percent)) / 5) * 10)
+
+    #Score penalty rule 2
+    #Each 2x2 block of the same color: the module matches the one to its
+    #left, the one above matches its left, and the module matches the one
+    #above it.
+    same = _same_pairs(bits, size)
+    blocks = same & (same >> size) & ~(bits ^ (bits >> size))
+    yield 1, _popcount(blocks) * 3
+
+    #Score penalty rule number 1, on the rows and the columns
+    yield 0, _rule1_rows(same) + _rule1_rows(_same_pairs(columns, size))
+
+    #Score penalty rule 3, on the rows and the columns
+    yield 2, (_rule3_rows(bits, size) + _rule3_rows(columns, size)) * 40
+
+
+def _penalty_scores(bits, columns, size):
+    """这个函数返回一个遮罩的4项惩罚分的列表，
+    其中 `bits` 参数是遮罩按行排列的整数，
+    `columns` 参数是遮罩按列排列的整数。
+    """
+    scores = [0, 0, 0, 0]
+    for rule, score in _penalty_terms(bits, columns, size):
+        scores[rule] = score
+    return scores
+
+
+def _score_masks(masks, columns, size):
+    """这个函数返回每个遮罩的4项惩罚分，是纯 Python 实现的后端。
+    其中 `masks` 参数是遮罩按行排列的整数列表，
+    `columns` 参数是遮罩按列排列的整数列表。
+    """
+    return [_penalty_scores(bits, cols, size)
+            for bits, cols in zip(masks, columns)]
+
+
+#: The lazily imported NumPy module, None if it is not installed.
+_numpy = False
+
+
+def _get_numpy():
+    """这个函数返回 NumPy 模块，如果没有安装 NumPy 就返回 `None` 值。"""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+
+def _pack_lanes(dark):
+    """这个函数把一组矩阵打包成按通道排列的 `uint64` 阵列，
+    其中 `dark` 参数是一个 (矩阵数, n, n) 形状的阵列，非0表示深色数据块。
+    返回一个 (n, n, 通道字数) 形状的阵列，其中每个数据块位置的每个字中，
+    每个比特是一个矩阵的这个数据块，矩阵数会补齐到64的倍数。
+    这样一次位运算就同时处理了64个矩阵。
+    """
+    np = _get_numpy()
+    count = len(dark)
+    lanes = np.moveaxis(dark != 0, 0, -1)
+    padding = -count % 64
+    if padding:
+        lanes = np.concatenate((lanes, np.zeros(lanes.shape[:-1] + (padding,),
+                                                bool)), axis=-1)
+    return np.ascontiguousarray(np.packbits(lanes, axis=-1)).view(np.uint64)
+
+
+def _lane_counts(words):
+    """这个函数返回每个通道中1的个数，是一个整数阵列，
+    其中 `words` 参数是一个最后一维是通道字的 `uint64` 阵列。
+
+    所有字两两相加，每个和都是按比特分开保存的，每一位是一个阵列，
+    这样每一步都是对所有通道同时做的位运算。只有最后的和才会展开成整数。
+    """
+    np = _get_numpy()
+    level = [words.reshape(-1, words.shape[-1])]
+    while len(level[0]) > 1:
+        if len(level[0]) % 2:
+            level = [np.concatenate((plane, np.zeros_like(plane[:1])))
+                     for plane in level]
+
+        #Ripple carry addition of the even and odd rows
+        added = []
+        carry = None
+        for plane in level:
+            a, b = plane[0::2], plane[1::2]
+            total = a ^ b
+            if carry is None:
+                carry = a & b
             else:
-                m[i-1][8] = bit
+                carry, total = (a & b) | (total & carry), total ^ carry
+            added.append(total)
+        added.append(carry)
+        level = added
+
+    counts = 0
+    for k, plane in enumerate(level):
+        bits = np.unpackbits(np.ascontiguousarray(plane[0]).view(np.uint8))
+        counts = counts + (bits.astype(np.int64) << k)
+    return counts
+
+
+def _lane_line_scores(lanes):
+    """这个函数返回一个元组，含有按行计算的惩罚规则1和规则3的分数，
+    每个通道一个分数。其中 `lanes` 参数是 :func:`_pack_lanes` 的返回值。
+    """
+    np = _get_numpy()
+    n = lanes.shape[1]
+
+    #Rule 1: Compare every module to the next one, a window of 4 same
+    #color pairs costs 1 and the start of each run costs 2 more
+    same = ~(lanes[:, 1:] ^ lanes[:, :-1])
+    runs = same[:, :-3] & same[:, 1:-2] & same[:, 2:-1] & same[:, 3:]
+    starts = np.concatenate((runs[:, :1], runs[:, 1:] & ~runs[:, :-1]),
+                            axis=1)
+    rule1 = _lane_counts(runs) + 2 * _lane_counts(starts)
+
+    #Rule 3: Find the 1011101 cores and the runs of four light modules,
+    #then combine the windows that start in the same place
+    light = ~lanes
+    core = (lanes[:, :n-6] & light[:, 1:n-5] & lanes[:, 2:n-4] &
+            lanes[:, 3:n-3] & lanes[:, 4:n-2] & light[:, 5:n-1] &
+            lanes[:, 6:])
+    zeros = light[:, :n-3] & light[:, 1:n-2] & light[:, 2:n-1] & \
+            light[:, 3:]
+    rule3 = _lane_counts(np.concatenate((zeros[:, :n-10] & core[:, 4:n-6],
+                                         core[:, :n-10] & zeros[:, 7:]),
+                                        axis=1))
+    return rule1, rule3
+
+
+def _lane_scores(lanes, count):
+    """这个函数返回 *count* 个矩阵的4项惩罚分，是一个 (矩阵数, 4) 形状的阵列，
+    其中 `lanes` 参数是 :func:`_pack_lanes` 的返回值。
+    """
+    np = _get_numpy()
+    size = lanes.shape[0]
+
+    row1, row3 = _lane_line_scores(lanes)
+    col1, col3 = _lane_line_scores(lanes.transpose(1, 0, 2))
+
+    #Score penalty rule 2, the module matches the one to its left, the
+    #one below matches its left, and the module matches the one below it
+    same = ~(lanes[:, 1:] ^ lanes[:, :-1])
+    blocks = same[:-1] & same[1:] & ~(lanes[:-1, :-1] ^ lanes[1:, :-1])
+    rule2 = _lane_counts(blocks)
+
+    #Same arithmetic as _penalty_scores so rule 4 rounds the same way,
+    #float64 operations round exactly like Python floats
+    ratio = _lane_counts(lanes) / (size * size)
+    percent = (ratio * 100) - 50
+    rule4 = np.trunc((np.abs(np.trunc(percent)) / 5) * 10)
+
+    scores = np.stack((row1 + col1, rule2 * 3, (row3 + col3) * 40,
+                       rule4.astype(np.int64)), axis=1)
+    return scores[:count]
+
+
+def _score_masks_numpy(masks, columns, size):
+    """这个函数返回每个遮罩的4项惩罚分，是 NumPy 实现的后端。
+    所有遮罩都打包到一个阵列的通道中，一次性计算完，
+    参数与 :func:`_score_masks` 函数一样，其中 `columns` 参数不会用到。
+    """
+    np = _get_numpy()
+    flat = ''.join(['{0:0{1}b}'.format(bits, size * size) for bits in masks])
+    dark = np.frombuffer(flat.encode('ascii'), dtype=np.uint8) == ord('1')
+    lanes = _pack_lanes(dark.reshape(len(masks), size, size))
+    return _lane_scores(lanes, len(masks)).tolist()
+
+
+#: The backends that can score the masks, keyed by name.
+_scorers = {'python': _score_masks, 'numpy': _score_masks_numpy}
+
+def _choose_exhaustive(code):
+    """这是一个遮罩选择策略，计算 *code* 二维码生成器所有遮罩的全部惩罚分，
+    然后返回合计惩罚分最低的遮罩索引位。
+    惩罚分由 `scoring` 属性所描述的后端来计算。
+    """
+    size = tables.version_size[code.version]
+    code.scores = _scorers[code.scoring](code.mask_bits, code.mask_columns,
+                                         size)
+
+    #Calculate the total for each score
+    totals = [sum(score) for score in code.scores]
+
+    #The lowest total wins
+    return totals.index(min(totals))
+
+
+def _choose_bound(code):
+    """这是一个遮罩选择策略，与 :func:`_choose_exhaustive` 选择一样的遮罩，
+    但是一旦某个遮罩的部分惩罚分不低于目前最好的合计分，
+    就停止计算这个遮罩，该遮罩的惩罚分记录为 `None` 值。
+
+    NumPy 后端会一次性计算所有遮罩，所以没有什么可以跳过的。
+    """
+    if code.scoring != 'python':
+        return _choose_exhaustive(code)
+
+    size = tables.version_size[code.version]
+    best, best_total = 0, None
+    code.scores = []
+    for n, (bits, columns) in enumerate(zip(code.mask_bits,
+                                            code.mask_columns)):
+        scores = [0, 0, 0, 0]
+        total = 0
+        for rule, score in _penalty_terms(bits, columns, size):
+            scores[rule] = score
+            total += score
+
+            #Ties go to the earlier mask, so an equal total already loses
+            if best_total is not None and total >= best_total:
+                scores = None
+                break
+
+        code.scores.append(scores)
+        if scores is not None:
+            best, best_total = n, total
+    return best
+
+
+#: The strategies that can choose the mask, keyed by name.
+_mask_strategies = {'exhaustive': _choose_exhaustive, 'bound': _choose_bound}
+
+
+#: The name of the backend used to score the masks when none is given to
+#: :py:class:`QRCodeBuilder`, either 'python' or 'numpy'.
+default_scoring = 'python'
+
+
+class _DataWordsBuilder(QRCodeBuilder):
+    """这个类只建立二维码的数据码字，保存在 `data_words` 属性中，
+    不计算错误纠正码字，也不建立二维码矩阵。给 :func:`_build_many_numpy`
+    函数使用。
+    """
+    def add_data(self):
+        self.data_words = self.make_data_words()
+
+    def make_code(self):
+        pass
+
+
+#: Cache of the NumPy arrays used to build many codes at once, keyed by
+#: (version, error).
+_numpy_layouts = {}
+
+
+def _get_numpy_layout(version, error, template):
+    """这个函数返回一个元组，含有 :func:`_build_many_numpy` 函数用到的
+    4个 NumPy 阵列，都是按行排列的扁平矩阵：
+    数据区域全部是0的 `template` 模板矩阵，按照放置顺序排列的数据块位置，
+    8种遮罩的比特图，以及 *error* 错误纠正级别下8种遮罩的类型信息。
+    """
+    layout = _numpy_layouts.get((version, error))
+    if layout is None:
+        np = _get_numpy()
+        size = len(template)
+
+        def unpack(bits):
+            flat = '{0:0{1}b}'.format(bits, size * size).encode('ascii')
+            return np.frombuffer(flat, np.uint8) - ord('0')
+
+        rows, cols = _get_data_positions(version, template)
+        positions = np.array(rows, np.intp) * size + np.array(cols, np.intp)
+        base = np.frombuffer(bytes(bytearray().join(template)), np.uint8)
+        base = base.copy()
+        base[positions] = 0
+        bitmaps = np.array([unpack(bits) for bits in
+                            _get_mask_bitmaps(version, template)])
+        types = np.array([unpack(_get_type_bits(version, error, n))
+                          for n in range(len(bitmaps))])
+        layout = _numpy_layouts[(version, error)] = (base, positions,
+                                                     bitmaps, types)
+    return layout
+
+
+#: The number of modules scored at once by _build_many_numpy, this bounds
+#: the size of the temporary arrays.
+_numpy_batch_modules = 1 << 24
+
+
+def _build_many_numpy(codes, version, error, mask=None):
+    """这个函数用 NumPy 一次性建立许多同样版本号和错误纠正级别的二维码，
+    返回每个二维码的 :class:`Matrix` 矩阵的列表，
+    与 :class:`QRCodeBuilder` 建立的矩阵完全一样。
+    其中 *codes* 参数是一个 (数据, 模式) 元组的列表，
+    数据和模式以及其它参数的意义都与 :class:`QRCodeBuilder` 一样。
+    *mask* 参数可以是 'exhaustive' 、 'bound' 或者一个整数，
+    不能是可调用对象。
+
+    每个二维码的数据码字还是逐个编码的，之后的步骤都对整批二维码一次完成：
+    用 :py:meth:`reedsolomon.BlockPlan.encode_many` 方法计算所有数据块的
+    错误纠正码字，用缓存的数据块位置阵列一次放置所有数据，用广播的异或运算
+    产生所有遮罩，然后一起计算惩罚分。惩罚分是分批计算的，
+    这样临时阵列的大小是有限的。
+    """
+    np = _get_numpy()
+    mask = _get_mask_strategy(mask)
+    if callable(mask):
+        raise ValueError('A callable mask strategy cannot be used to build '
+                         'many codes at once.')
+    if not codes:
+        return []
+
+    #Encode the data words of every code
+    words = bytearray()
+    for data, mode in codes:
+        code = _DataWordsBuilder(data, version, mode, error)
+        words.extend(code.data_words)
+    error = code.error
+    plan = reedsolomon.get_block_plan(version, error)
+    if len(words) != len(codes) * plan.data_words:
+        raise ValueError('Too much data for this code version.')
+
+    template = code.make_template()
+    size = len(template)
+    base, positions, bitmaps, types = _get_numpy_layout(version, error,
+                                                        template)
+
+    #Calculate the error blocks of all the codes, then scatter the bits
+    #into the data modules. The remainder bits stay 0.
+    words = np.frombuffer(bytes(words), np.uint8)
+    words = plan.encode_many(words.reshape(len(codes), plan.data_words))
+    bits = np.unpackbits(words, axis=1)
+    unmasked = np.repeat(base[np.newaxis], len(codes), axis=0)
+    unmasked[:, positions[:bits.shape[1]]] = bits
+
+    if isinstance(mask, int):
+        #The caller forced the mask, there is nothing to score
+        best = np.full(len(codes), mask, np.intp)
+    else:
+        #The codes are packed into lanes, 64 codes per word. Every mask
+        #flips whole words, so the masks are applied to the packed codes.
+        flips = np.where(bitmaps, ~np.uint64(0), np.uint64(0))
+        sets = np.where(types, ~np.uint64(0), np.uint64(0))
+        best = np.empty(len(codes), np.intp)
+        step = max(64, _numpy_batch_modules //
+                   (len(bitmaps) * size * size) // 64 * 64)
+        for start in range(0, len(codes), step):
+            part = unmasked[start:start+step]
+            lanes = _pack_lanes(part.reshape(-1, size, size))
+            lanes = lanes.reshape(1, size * size, -1)
+            masks = (lanes ^ flips[..., np.newaxis]) | sets[..., np.newaxis]
+
+            #Lane k * width + n is mask k of code n
+            width = masks.shape[-1] * 64
+            masks = masks.transpose(1, 0, 2).reshape(size, size, -1)
+            scores = _lane_scores(masks, len(bitmaps) * width)
+            totals = scores.sum(axis=1).reshape(len(bitmaps), width)
+
+            #Both strategies choose the mask with the lowest total, ties
+            #go to the earlier mask like argmin
+            best[start:start+step] = totals.argmin(axis=0)[:len(part)]
+
+    matrices = (unmasked ^ bitmaps[best]) | types[best]
+    return [Matrix.from_bytes(matrix.tobytes(), size) for matrix in matrices]
+
 
 ##############################################################################
 ##############################################################################
@@ -1239,7 +2174,8 @@ def _svg(code, version, file, scale=1, module_color='#000', background=None,
 
 
 def _png(code, version, file, scale=1, module_color=(0, 0, 0, 255),
-         background=(255, 255, 255, 255), quiet_zone=4, debug=False):
+         background=(255, 255, 255, 255), quiet_zone=4, debug=False,
+         compression=None, strategy=None, row_filter=None, optimize=False):
     """阅读： pyqrcode.QRCode.png() 文档字符串。
 
     这个函数提取自 QRCode ，在建立过程中允许二维码的输出。
@@ -1247,7 +2183,7 @@ def _png(code, version, file, scale=1, module_color=(0, 0, 0, 255),
     计算 PNG 大小时也会用到本函数。
 
     这个函数会把提供的 `path` 参数值写成一个 PNG 文件。
-    注意，需要用到 PyPNG 模块来实现这个函数。
+    PNG 文件是本模块自己用 `zlib` 模块写出来的，不需要 PyPNG 模块。
 
     :param module_color: 二维码的颜色 (默认值是： ``(0, 0, 0, 255)`` (黑色))
     :param background: 可选的背景色。如果参数值是 ``None`` 的话，
@@ -1257,134 +2193,531 @@ def _png(code, version, file, scale=1, module_color=(0, 0, 0, 255),
             (默认值是： ``4``)。如果不需要边界宽参数值设置成 (``0``) 。
     :param debug: 指明如果二维码中有错误的话，是否应该增加 (红色数据块)
             到输出结果中 (默认值是： ``False``)。
+    :param compression: `zlib` 的压缩级别，0到9
+            (默认值是： ``None`` (zlib 的默认级别))。
+    :param strategy: `zlib` 的压缩策略， ``'default'`` 、 ``'filtered'`` 、
+            ``'huffman'`` 、 ``'rle'`` 或 ``'fixed'`` (默认值是： ``None``)。
+    :param row_filter: 每个扫描行的 PNG 过滤器， ``'none'`` 、 ``'sub'`` 、
+            ``'up'`` 、 ``'average'`` 、 ``'paeth'`` ，或者 ``'adaptive'``
+            为每行选择一个过滤器 (默认值是： ``None`` (不过滤))。
+    :param optimize: 指明是否选择最小的颜色编码方式
+            (默认值是： ``False``)。阅读 :func:`_png_encoding` 函数。
     """
-    import png
-    
     # Coerce scale parameter into an integer
     try:
         scale = int(scale)
     except ValueError:
         raise ValueError('The scale parameter must be an integer')
 
-    def scale_code(size):
-        """要执行标量化，我们需要增加比特的数量。
-        当 `png` 库绘制 PNG 图像时期望得到所有的比特。
-        有效率地做法是，我们用2倍、3倍，等等倍数作用在列数量和行数量上。
-        """
-        # This is one row's worth of each possible module
-        # PNG's use 0 for black and 1 for white, this is the
-        # reverse of the QR standard
-        black = [0] * scale
-        white = [1] * scale
-
-        # Tuple to lookup colors
-        # The 3rd color is the module_color unless "debug" is enabled
-        colors = (white, black, (([2] * scale) if debug else black))
-
-        # Whitespace added on the left and right side
-        border_module = white * quiet_zone
-        # This is the row to show up at the top and bottom border
-        border_row = [[1] * size] * scale * quiet_zone
-
-        # This will hold the final PNG's bits
-        bits = []
-
-        # Add scale rows before the code as a border,
-        # as per the standard
-        bits.extend(border_row)
-
-        # Add each row of the to the final PNG bits
-        for row in code:
-            tmp_row = []
-
-            # Add one all white module to the beginning
-            # to create the vertical border
-            tmp_row.extend(border_module)
-
-            # Go through each bit in the code
-            for bit in row:
-                # Use the standard color or the "debug" color
-                tmp_row.extend(colors[(bit if bit in (0, 1) else 2)])
-
-            # Add one all white module to the end
-            # to create the vertical border
-            tmp_row.extend(border_module)
-
-            # Copy each row scale times
-            for n in range(scale):
-                bits.append(tmp_row)
-
-        # Add the bottom border
-        bits.extend(border_row)
-
-        return bits
-
-    def png_pallete_color(color):
-        """这里从一个列表或一个元组建立一个调色板。
-        列表或元组必须是长度3 (rgb) 或长度4 (rgba)。
-        取值必须在0和255之间。
-        注意，rgb颜色加上一个alpha成份要设置成255。
-
-        调色板表示成一个元组，返回的也就是这个元组。
-        """
-        if color is None:
-            return ()
-        if not isinstance(color, (tuple, list)):
-            r, g, b = _hex_to_rgb(color)
-            return r, g, b, 255
-        rgba = []
-        if not (3 <= len(color) <= 4):
-            raise ValueError('Colors must be a list or tuple of length '
-                             ' 3 or 4. You passed in "{0}".'.format(color))
-        for c in color:
-            c = int(c)
-            if 0 <= c <= 255:
-                rgba.append(int(c))
-            else:
-                raise ValueError('Color components must be between 0 and 255')
-        # Make all colors have an alpha channel
-        if len(rgba) == 3:
-            rgba.append(255)
-        return tuple(rgba)
-
     if module_color is None:
         raise ValueError('The module_color must not be None')
 
+    if compression is None:
+        compression = zlib.Z_DEFAULT_COMPRESSION
+    elif not 0 <= compression <= 9:
+        raise ValueError('Illegal compression level {0}, the level must be '
+                         'between 0 and 9.'.format(compression))
+    if strategy not in _png_strategies:
+        raise ValueError('{0} is not a valid compression '
+                         'strategy.'.format(strategy))
+    if row_filter not in _png_filters:
+        raise ValueError('{0} is not a valid row filter.'.format(row_filter))
+
     bitdepth = 1
     # foreground aka module color
-    fg_col = png_pallete_color(module_color)
+    fg_col = _png_color(module_color)
     transparent = background is None
     # If background color is set to None, the inverse color of the
     # foreground color is calculated
-    bg_col = png_pallete_color(background) if background is not None else tuple([255 - c for c in fg_col])
-    # Assume greyscale if module color is black and background color is white
-    greyscale = fg_col[:3] == (0, 0, 0) and (not debug and transparent or bg_col == (255, 255, 255, 255))
+    bg_col = _png_color(background) if background is not None else tuple([255 - c for c in fg_col])
+    # Assume greyscale if module color is opaque black and background color
+    # is white, the red error modules need a palette
+    greyscale = not debug and fg_col == (0, 0, 0, 255) and (transparent or bg_col == (255, 255, 255, 255))
     transparent_color = 1 if transparent and greyscale else None
     palette = [fg_col, bg_col] if not greyscale else None
+    invert = False
     if debug:
         # Add "red" as color for error modules
         palette.append((255, 0, 0, 255))
         bitdepth = 2
+    if optimize:
+        palette, transparent_color, invert = _png_encoding(fg_col, bg_col,
+                                                           debug)
 
     # The size of the PNG
     size = _get_png_size(version, scale, quiet_zone)
 
-    # We need to increase the size of the code to match up to the
-    # scale parameter.
-    code_rows = scale_code(size)
+    scanlines = _png_scanlines(code, scale, quiet_zone, bitdepth, debug,
+                               invert)
+    if _png_filters[row_filter]:
+        scanlines = _png_filter_scanlines(scanlines, row_filter)
+    compressor = zlib.compressobj(compression, zlib.DEFLATED, zlib.MAX_WBITS,
+                                  zlib.DEF_MEM_LEVEL,
+                                  _png_strategies[strategy])
 
     # Write out the PNG
     f, autoclose = _get_writable(file, 'wb')
-    w = png.Writer(width=size, height=size, greyscale=greyscale,
-                   transparent=transparent_color, palette=palette,
-                   bitdepth=bitdepth)
     try:
-        w.write(f, code_rows)
+        _write_png(f, size, bitdepth, palette, transparent_color, scanlines,
+                   compressor)
     finally:
         if autoclose:
             f.close()
 
 
+#: The PNG file signature.
+_png_signature = b'\x89PNG\r\n\x1a\n'
+
+#: The zlib compression strategies, by name. The values are the ones of
+#: zlib.h, older Pythons do not have all of the constants.
+_png_strategies = {None: 0, 'default': 0, 'filtered': 1, 'huffman': 2,
+                   'rle': 3, 'fixed': 4}
+
+#: The PNG row filter types, by name. 'adaptive' picks one for each row.
+_png_filters = {None: 0, 'none': 0, 'sub': 1, 'up': 2, 'average': 3,
+                'paeth': 4, 'adaptive': -1}
+
+#: The size of the compressed data written in one IDAT chunk.
+_png_idat_size = 64 * 1024
+
+#: Cache of the byte lookup tables that scale packed pixels, keyed by
+#: (bitdepth, scale).
+_png_scale_tables = {}
+
+
+def _get_png_scale_table(bitdepth, scale):
+    """这个函数返回一个256项的查询表，其中第 `b` 项是字节 `b` 中的
+    每个像素都重复 *scale* 次以后得到的 *scale* 个字节。
+    其中 *bitdepth* 参数是每个像素的比特数，1或2。
+    """
+    key = (bitdepth, scale)
+    table = _png_scale_tables.get(key)
+    if table is None:
+        pixel_mask = (1 << bitdepth) - 1
+        #A pixel value times this is the pixel repeated scale times
+        repeat = sum(1 << (bitdepth * i) for i in range(scale))
+        table = []
+        for byte in range(256):
+            value = 0
+            for shift in range(8 - bitdepth, -1, -bitdepth):
+                pixel = (byte >> shift) & pixel_mask
+                value = (value << (bitdepth * scale)) | (pixel * repeat)
+            table.append(reedsolomon._int_to_bytes(value, scale))
+        _png_scale_tables[key] = table
+    return table
+
+
+def _png_scanlines(code, scale, quiet_zone, bitdepth, debug, invert=False):
+    """这个生成器函数逐行产生 PNG 图片的扫描行，每行是 `bytes` 字节，
+    以过滤器类型0开头，后面是 :func:`_packed_rows` 函数打包好的像素。
+    重复的扫描行仍然是同一个对象。
+    """
+    previous = None
+    for row in _packed_rows(code, scale, quiet_zone, bitdepth, debug, invert):
+        if row is not previous:
+            line = b'\x00' + row
+            previous = row
+        yield line
+
+
+def _packed_rows(code, scale, quiet_zone, bitdepth, debug, invert=False):
+    """这个生成器函数逐行产生二维码图片的像素行，每行是 `bytes` 字节，
+    其中像素按 *bitdepth* 比特打包好，最高有效位在前，每行补满最后一个字节。
+
+    每一行数据块只打包一次：先把整行当成一个以 `2 ** bitdepth` 为底的数字
+    打包成字节，再用字节查询表把每个字节放大 *scale* 倍。
+    放大后同样的扫描行会重复产生 *scale* 次，不会重新打包。
+
+    深色数据块的像素值是0，浅色数据块的像素值是1。如果 *invert*
+    参数是 `True` 的话，两个像素值会互换。
+    """
+    per_byte = 8 // bitdepth
+    width = len(code) + 2 * quiet_zone
+    row_bytes = (width * scale * bitdepth + 7) // 8
+    table = _get_png_scale_table(bitdepth, scale) if scale > 1 else None
+
+    #Translates module values into the ASCII digit of their pixel value.
+    #Anything else is dark, or the red pixel 2 when debugging.
+    light, dark = (b'0', b'1') if invert else (b'1', b'0')
+    pixels = _make_translation(bytearray(range(256)),
+                               light + dark + (b'2' if debug else dark) * 254)
+
+    #Light modules for the border, and zero pixels to fill the last byte
+    border = light * quiet_zone
+    padding = b'0' * (-width % per_byte)
+
+    def scanline(digits):
+        packed = reedsolomon._int_to_bytes(int(digits, 1 << bitdepth),
+                                           len(digits) // per_byte)
+        if table is not None:
+            packed = b''.join([table[b] for b in bytearray(packed)])
+        return packed[:row_bytes]
+
+    # This is the row to show up at the top and bottom border
+    border_row = scanline(light * width + padding)
+    for n in range(quiet_zone * scale):
+        yield border_row
+
+    for row in code:
+        line = scanline(border + bytes(bytearray(row).translate(pixels)) +
+                        border + padding)
+        for n in range(scale):
+            yield line
+
+    for n in range(quiet_zone * scale):
+        yield border_row
+
+
+def _png_encoding(fg_col, bg_col, debug):
+    """这个函数为 *fg_col* 深色和 *bg_col* 浅色两个 RGBA 颜色选择最小的
+    PNG 颜色编码方式，返回一个 (调色板, 透明的灰度值, 是否互换像素值) 元组。
+
+    如果两个颜色是一黑一白，而且最多只有一个颜色是完全透明的，
+    就用不需要 PLTE 数据块的灰度图片，透明的颜色用 tRNS 数据块中的灰度值表示。
+    否则使用调色板，透明的颜色排在前面，不透明的颜色不写进 tRNS 数据块，
+    所有颜色都不透明时就没有 tRNS 数据块。
+    """
+    greys = {(0, 0, 0): 0, (255, 255, 255): 1}
+    fg_grey = greys.get(fg_col[:3])
+    bg_grey = greys.get(bg_col[:3])
+    alphas = (fg_col[3], bg_col[3])
+    if not debug and fg_grey is not None and bg_grey is not None and \
+       fg_grey != bg_grey and set(alphas) <= set((0, 255)) and 255 in alphas:
+        transparent = None
+        if fg_col[3] == 0:
+            transparent = fg_grey
+        elif bg_col[3] == 0:
+            transparent = bg_grey
+        return None, transparent, fg_grey == 1
+
+    palette = [fg_col, bg_col]
+    if debug:
+        palette.append((255, 0, 0, 255))
+    #Put a transparent light color first, the dark color is then opaque
+    invert = not debug and fg_col[3] == 255 and bg_col[3] < 255
+    if invert:
+        palette.reverse()
+    #Opaque colors at the end need no tRNS entry
+    for n in range(len(palette) - 1, -1, -1):
+        if palette[n][3] != 255:
+            break
+        palette[n] = palette[n][:3]
+    return palette, None, invert
+
+
+def _png_filter_scanlines(scanlines, row_filter):
+    """这个生成器函数用 *row_filter* 过滤器过滤 *scanlines* 中的每个扫描行，
+    阅读 :func:`_png_scanlines` 函数。扫描行中的像素都少于8个比特，
+    所以过滤时每个字节的左边是前面一个字节。
+
+    放大后重复的扫描行是同一个对象，过滤后的结果也只计算一次。
+    """
+    kind = _png_filters[row_filter]
+    previous = None
+    repeated = None
+    for line in scanlines:
+        if line is previous:
+            if repeated is None:
+                repeated = _png_filter_line(kind, line, line)
+            yield repeated
+        else:
+            yield _png_filter_line(kind, line, previous)
+            previous = line
+            repeated = None
+
+
+def _png_filter_line(kind, line, prior):
+    """这个函数返回用 *kind* 类型过滤器过滤后的 *line* 扫描行，
+    *prior* 参数是上一个扫描行，第一行是 `None` 值。
+    类型-1会选择差值绝对值之和最小的过滤器。
+    """
+    if kind == -1:
+        best = None
+        for kind in range(5):
+            filtered = _png_filter_line(kind, line, prior)
+            cost = sum(b if b < 128 else 256 - b
+                       for b in bytearray(filtered)[1:])
+            if best is None or cost < best[0]:
+                best = (cost, filtered)
+        return best[1]
+
+    raw = bytearray(line)[1:]
+    above = bytearray(prior)[1:] if prior is not None else bytearray(len(raw))
+    left = bytearray(1) + raw[:-1]
+    upper_left = bytearray(1) + above[:-1]
+
+    if kind == 0:
+        result = raw
+    elif kind == 1:
+        result = bytearray((x - a) & 0xFF for x, a in zip(raw, left))
+    elif kind == 2:
+        result = bytearray((x - b) & 0xFF for x, b in zip(raw, above))
+    elif kind == 3:
+        result = bytearray((x - ((a + b) >> 1)) & 0xFF
+                           for x, a, b in zip(raw, left, above))
+    else:
+        result = bytearray((x - _paeth(a, b, c)) & 0xFF
+                           for x, a, b, c in zip(raw, left, above, upper_left))
+    return bytes(bytearray([kind]) + result)
+
+
+def _paeth(a, b, c):
+    """这个函数返回 PNG Paeth 过滤器的预测值。"""
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+
+def _write_png(f, size, bitdepth, palette, transparent, scanlines,
+               compressor):
+    """这个函数把一个 *size* 乘以 *size* 像素的 PNG 图片写到 *f* 流数据中。
+    如果有 *palette* 调色板的话，图片是调色板图片，否则是灰度图片，
+    *transparent* 参数是灰度图片中透明的像素值，或者是 `None` 值。
+    调色板中的 RGBA 颜色的透明度写在 tRNS 数据块中， RGB 颜色是不透明的，
+    只能放在所有 RGBA 颜色的后面。
+    其中 *scanlines* 参数是产生扫描行的可迭代对象，
+    阅读 :func:`_png_scanlines` 函数。 *compressor* 参数是
+    `zlib.compressobj` 压缩对象。
+
+    扫描行是一行一行压缩的，压缩后的数据每满 `_png_idat_size` 个字节
+    就写成一个 IDAT 数据块。所以不管图片有多大，内存中只有一个扫描行
+    和一个数据块。
+    """
+    color_type = 3 if palette else 0
+    f.write(_png_signature)
+    _write_png_chunk(f, b'IHDR', reedsolomon._int_to_bytes(size, 4) * 2 +
+                     bytes(bytearray([bitdepth, color_type, 0, 0, 0])))
+    if palette:
+        _write_png_chunk(f, b'PLTE', bytes(bytearray(c for color in palette
+                                                       for c in color[:3])))
+        alphas = bytes(bytearray(color[3] for color in palette
+                                 if len(color) > 3))
+        if alphas:
+            _write_png_chunk(f, b'tRNS', alphas)
+    if transparent is not None:
+        _write_png_chunk(f, b'tRNS', reedsolomon._int_to_bytes(transparent, 2))
+
+    compressed = []
+    length = 0
+    for line in scanlines:
+        data = compressor.compress(line)
+        if data:
+            compressed.append(data)
+            length += len(data)
+            if length >= _png_idat_size:
+                _write_png_chunk(f, b'IDAT', b''.join(compressed))
+                compressed = []
+                length = 0
+    compressed.append(compressor.flush())
+    _write_png_chunk(f, b'IDAT', b''.join(compressed))
+    _write_png_chunk(f, b'IEND', b'')
+
+
+def _write_png_chunk(f, tag, data):
+    """这个函数把一个 PNG 数据块写到 *f* 流数据中，含有长度和校验和。"""
+    f.write(reedsolomon._int_to_bytes(len(data), 4))
+    f.write(tag)
+    f.write(data)
+    f.write(reedsolomon._int_to_bytes(zlib.crc32(tag + data) & 0xFFFFFFFF, 4))
+
+
+def _png_color(color):
+    """这个函数从一个列表、一个元组或一个十六进制颜色字符串建立一个调色板。
+    列表或元组必须是长度3 (rgb) 或长度4 (rgba)。
+    取值必须在0和255之间。
+    注意，rgb颜色加上一个alpha成份要设置成255。
+
+    调色板表示成一个元组，返回的也就是这个元组。
+    """
+    if color is None:
+        return ()
+    if not isinstance(color, (tuple, list)):
+        r, g, b = _hex_to_rgb(color)
+        return r, g, b, 255
+    rgba = []
+    if not (3 <= len(color) <= 4):
+        raise ValueError('Colors must be a list or tuple of length '
+                         ' 3 or 4. You passed in "{0}".'.format(color))
+    for c in color:
+        c = int(c)
+        if 0 <= c <= 255:
+            rgba.append(int(c))
+        else:
+            raise ValueError('Color components must be between 0 and 255')
+    # Make all colors have an alpha channel
+    if len(rgba) == 3:
+        rgba.append(255)
+    return tuple(rgba)
+
+
+#: A rendered image as raw pixels, see :py:meth:`pyqrcode.QRCode.raster`.
+#: The *data* holds *height* rows of *stride* bytes each, *width* and
+#: *height* are in pixels and *mode* is the pixel format.
+Raster = collections.namedtuple('Raster', 'data width height stride mode')
+
+#: The number of bytes of a pixel in each raster mode, 0 for 1-bit pixels.
+_raster_modes = {'1': 0, 'L': 1, 'RGB': 3, 'RGBA': 4, 'BGRA': 4}
+
+#: Cache of the byte lookup tables that expand the 8 pixels of a packed
+#: byte into pixel bytes, keyed by the (dark, light) pixel bytes. It is
+#: cleared once it holds 16 tables.
+_raster_tables = {}
+
+
+def _raster(code, version, scale=1, quiet_zone=4, mode='1',
+            module_color=(0, 0, 0, 255), background=(255, 255, 255, 255)):
+    """阅读： pyqrcode.QRCode.raster() 文档字符串。
+
+    这个函数返回一个 :data:`Raster` 元组，其中含有二维码图片的原始像素，
+    阅读 :func:`_raster_lines` 函数。
+    """
+    width, stride, lines = _raster_lines(code, version, scale, quiet_zone,
+                                         mode, module_color, background)
+    return Raster(b''.join(lines), width, width, stride, mode)
+
+
+def _raster_into(code, version, buffer, x=0, y=0, stride=None, mode='RGBA',
+                 scale=1, quiet_zone=4, module_color=(0, 0, 0, 255),
+                 background=(255, 255, 255, 255)):
+    """阅读： pyqrcode.QRCode.raster_into() 文档字符串。
+
+    这个函数把二维码图片的像素写到 *buffer* 缓冲区中，左上角在 (*x*, *y*)
+    像素的位置，然后返回图片的宽和高。像素行与 :func:`_raster` 函数一样，
+    每一行直接写到缓冲区的一个切片中，不会建立整个图片。
+    """
+    view = memoryview(buffer)
+    if view.readonly:
+        raise ValueError('The buffer must be writable.')
+    if stride is None:
+        if view.ndim < 2:
+            raise ValueError('The stride of a one-dimensional buffer must be '
+                             'given.')
+        stride = view.strides[0]
+    if view.ndim != 1 or view.format != 'B':
+        #Python 2 memory views cannot be cast, only flat byte buffers work
+        if not hasattr(view, 'cast'):
+            raise ValueError('buffer must be a one-dimensional byte buffer')
+        if not view.c_contiguous:
+            raise ValueError('buffer must be C-contiguous')
+        view = view.cast('B')
+    if x < 0 or y < 0:
+        raise ValueError('Illegal position ({0}, {1}), the position cannot '
+                         'be negative.'.format(x, y))
+
+    width, row_bytes, lines = _raster_lines(code, version, scale, quiet_zone,
+                                            mode, module_color, background)
+    pixel_bits = 8 * _raster_modes[mode] or 1
+    first = x * pixel_bits // 8
+    last = ((x + width) * pixel_bits + 7) // 8
+    if last > stride or (y + width - 1) * stride + last > len(view):
+        raise ValueError('The code of {0}x{0} pixels at ({1}, {2}) does not '
+                         'fit into the buffer.'.format(width, x, y))
+
+    if mode != '1':
+        offset = y * stride + first
+        for line in lines:
+            view[offset:offset + row_bytes] = line
+            offset += stride
+        return width, width
+
+    #The 1-bit rows are shifted to the pixel and merged with the bits
+    #around them in the first and the last byte
+    length = last - first
+    padding = 8 * length - (x % 8) - width
+    mask = ((1 << width) - 1) << padding
+    offset = y * stride + first
+    previous = None
+    for line in lines:
+        if line is not previous:
+            previous = line
+            bits = (int(binascii.hexlify(line), 16) >>
+                    (8 * row_bytes - width)) << padding
+        old = int(binascii.hexlify(view[offset:offset + length].tobytes()), 16)
+        view[offset:offset + length] = \
+            reedsolomon._int_to_bytes((old & ~mask) | bits, length)
+        offset += stride
+    return width, width
+
+
+def _raster_lines(code, version, scale, quiet_zone, mode, module_color,
+                  background):
+    """这个函数返回一个 (宽, 每行的字节数, 像素行) 元组，
+    其中像素行是一个逐行产生 *mode* 格式像素的迭代器。
+
+    像素行与 PNG 输出用同样的方法打包和放大，阅读 :func:`_packed_rows`
+    函数。1个比特以外的模式再用一个字节查询表，
+    把每个字节中的8个像素展开成像素字节。
+    重复的像素行仍然是同一个对象，只展开一次。
+    """
+    # Coerce scale parameter into an integer
+    try:
+        scale = int(scale)
+    except ValueError:
+        raise ValueError('The scale parameter must be an integer')
+
+    if mode not in _raster_modes:
+        raise ValueError('{0} is not a valid raster mode.'.format(mode))
+    pixel_bytes = _raster_modes[mode]
+
+    width = _get_png_size(version, scale, quiet_zone)
+    rows = _packed_rows(code, scale, quiet_zone, 1, False)
+    if not pixel_bytes:
+        return width, (width + 7) // 8, rows
+
+    row_bytes = width * pixel_bytes
+    table = _get_raster_table(*_raster_colors(mode, module_color, background))
+
+    def expand():
+        previous = None
+        for row in rows:
+            if row is not previous:
+                previous = row
+                line = b''.join([table[b] for b in bytearray(row)])[:row_bytes]
+            yield line
+
+    return width, row_bytes, expand()
+
+
+def _raster_colors(mode, module_color, background):
+    """这个函数返回 *mode* 格式中深色像素和浅色像素的字节。
+    颜色参数与 :func:`_png` 函数一样，'L' 模式总是黑白两色。
+    """
+    if mode == 'L':
+        return b'\x00', b'\xff'
+
+    if module_color is None:
+        raise ValueError('The module_color must not be None')
+    fg_col = _png_color(module_color)
+    # Transparent background as in png()
+    bg_col = _png_color(background) if background is not None else \
+             tuple([255 - c for c in fg_col])
+    order = {'RGB': (0, 1, 2), 'RGBA': (0, 1, 2, 3),
+             'BGRA': (2, 1, 0, 3)}[mode]
+    return (bytes(bytearray(fg_col[i] for i in order)),
+            bytes(bytearray(bg_col[i] for i in order)))
+
+
+def _get_raster_table(dark, light):
+    """这个函数返回一个256项的查询表，其中第 `b` 项是字节 `b` 中的
+    8个像素展开后的字节，0比特是 *dark* 像素，1比特是 *light* 像素。
+    """
+    key = (dark, light)
+    table = _raster_tables.get(key)
+    if table is None:
+        table = [b''.join(light if (byte >> (7 - i)) & 1 else dark
+                          for i in range(8))
+                 for byte in range(256)]
+        #Only a few colors are used at a time, keep the cache small
+        if len(_raster_tables) >= 16:
+            _raster_tables.clear()
+        _raster_tables[key] = table
+    return table
+
+
 def _eps(code, version, file_or_path, scale=1, module_color=(0, 0, 0),
          background=None, quiet_zone=4):
     """这个函数是把二维码写成一种 EPS 文档格式。
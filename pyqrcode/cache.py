@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013, Michael Nooner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""本模块是已经建立好的二维码矩阵和输出结果的缓存。
+
+同样的内容、错误纠正级别、版本号、模式和编码格式总会建立同样的二维码，
+所以重复出现的内容不需要每次都重新建立。缓存默认是关闭的，
+把一个 :class:`MatrixCache` 实例赋值给 `pyqrcode.matrix_cache`
+变量就可以打开缓存。输出结果的缓存 :class:`RenderCache`
+需要交给输出方法的 *cache* 参数。
+
+Examples:
+        >>> import pyqrcode
+        >>> import pyqrcode.cache
+        >>> pyqrcode.matrix_cache = pyqrcode.cache.MatrixCache(16 * 1024 * 1024)
+        >>> pyqrcode.create('https://example.com/pay').code
+        >>> pyqrcode.create('https://example.com/pay').code  # From the cache
+        >>> pyqrcode.matrix_cache.info()
+        CacheInfo(hits=1, misses=1, evictions=0, entries=1, size=..., max_size=16777216)
+"""
+
+#Imports required for 2.x support
+from __future__ import absolute_import, division, print_function, with_statement, unicode_literals
+
+import collections
+import pyqrcode.builder as builder
+import sys
+import threading
+
+#: The statistics of a cache, see :py:meth:`MatrixCache.info`.
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses evictions '
+                                                'entries size max_size')
+
+#: The output formats whose options are converted like the PNG options.
+_png_kinds = ('png', 'png_base64')
+
+
+class _LRUCache(object):
+    """这个类是一个有大小限制的最近最少使用（LRU）缓存，其中保存的值都是
+    `bytes` 字节或字符串。可以在多个线程中同时使用。
+
+    其中 *max_size* 参数是缓存最多使用的内存，以字节为单位，
+    包含值和键。缓存满了以后，最久没有使用的值会被移除。
+    比 *max_size* 还大的值不会被缓存。
+    """
+    def __init__(self, max_size=32 * 1024 * 1024):
+        if max_size < 0:
+            raise ValueError('Illegal cache size {0}, the size cannot be '
+                             'negative.'.format(max_size))
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """这个方法返回 *key* 键的值，如果没有缓存就返回 `None` 值。
+        找到的值会成为最近使用的值。
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            #Put it back at the most recently used end
+            self._entries[key] = entry
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """这个方法把 *value* 值保存成 *key* 键的值，
+        然后移除最久没有使用的值，直到缓存的大小不超过 `max_size` 属性。
+        """
+        size = self._get_size(key, value)
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+
+            while self._size > self.max_size:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+                self._evictions += 1
+
+    def clear(self):
+        """这个方法移除所有缓存的值，统计数据保持不变。"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def info(self):
+        """这个方法返回缓存的统计数据，是一个 :data:`CacheInfo` 元组，
+        其中含有命中次数、未命中次数、移除次数、值的个数、
+        已用大小和最大大小。
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions,
+                             len(self._entries), self._size, self.max_size)
+
+    def _get_size(self, key, value):
+        """这个方法估算一个缓存项使用的内存，以字节为单位。"""
+        return sys.getsizeof(value) + sys.getsizeof(key)
+
+
+class MatrixCache(_LRUCache):
+    """这个类是建立好的二维码矩阵的 LRU 缓存，
+    阅读 :class:`_LRUCache` 了解 *max_size* 参数的信息。
+    键是 :class:`pyqrcode.QRCode` 的编码后的数据段等信息，
+    大小也包含了键中的数据。
+
+    每个矩阵都按行保存成 `bytes` 字节，每个字节是一个数据块，
+    这样保存的矩阵不会因为用户修改返回的矩阵而改变。
+    """
+    def _get_size(self, key, value):
+        """这个方法估算一个缓存项使用的内存，以字节为单位，
+        包含矩阵字节和键中每个数据段的数据。
+        """
+        segments = key[0]
+        return _LRUCache._get_size(self, key, value) + \
+               sum(sys.getsizeof(data) for mode, data in segments)
+
+
+class RenderCache(_LRUCache):
+    """这个类是输出好的二维码的 LRU 缓存，例如 PNG 图片和 SVG 文档，
+    阅读 :class:`_LRUCache` 了解 *max_size* 参数的信息。
+
+    把缓存交给 :py:meth:`pyqrcode.QRCode.png` 、
+    :py:meth:`pyqrcode.QRCode.png_as_base64_str` 或
+    :py:meth:`pyqrcode.QRCode.svg` 方法的 *cache* 参数，
+    同样的矩阵用同样的选项输出时，就直接返回保存的字节，不会重新输出。
+    base64 字符串以 'png_base64' 格式单独保存，不会每次都重新编码。
+    键是二维码的 :py:attr:`pyqrcode.QRCode.digest` 摘要、输出格式，
+    以及规范化之后的输出选项。
+
+    Example:
+        >>> renders = pyqrcode.cache.RenderCache(64 * 1024 * 1024)
+        >>> code = pyqrcode.create('https://example.com/pay')
+        >>> image = code.png_as_base64_str(scale=5, cache=renders)
+    """
+    def render(self, code, kind, options, renderer):
+        """这个方法返回 *code* 二维码用 *kind* 格式和 *options* 选项字典
+        输出后的字节。如果没有缓存，就调用 *renderer* 参数输出二维码，
+        它是一个没有参数的可调用对象，返回输出后的字节。
+        """
+        key = (code.digest, kind, _get_options_key(kind, options))
+        value = self.get(key)
+        if value is None:
+            value = renderer()
+            self.put(key, value)
+        return value
+
+
+def _get_options_key(kind, options):
+    """这个函数返回 *kind* 格式的 *options* 输出选项规范化之后的元组，
+    用作缓存键的一部分。
+
+    PNG 和 base64 PNG 的标量和颜色按照输出时的方式来转换，所以 `2.5` 和 `2` ，
+    `'#000'` 和 `(0, 0, 0, 255)` 都是同样的键。其它选项保留值的类型，
+    因为例如 SVG 中 `2` 和 `2.0` 输出的文档是不一样的。
+    """
+    key = []
+    for name, value in sorted(options.items()):
+        if kind in _png_kinds and name == 'scale':
+            value = int(value)
+        elif kind in _png_kinds and name in ('module_color', 'background'):
+            value = builder._png_color(value)
+        elif isinstance(value, list):
+            value = tuple(value)
+        key.append((name, type(value).__name__, value))
+    return tuple(key)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013, Michael Nooner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the copyright holder nor the names of its 
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""本模块是二维码所用的 GF(256) 里德-所罗门错误纠正编码器。
+所有的乘法都通过预先计算好的数据表来完成，每种二维码版本号和
+错误纠正级别的分块计划也只计算一次，然后会缓存起来。
+
+要理解这里的算法你需要阅读如下网址提供的内容：
+
+* http://www.thonky.com/qr-code-tutorial/part-2-error-correction/
+* http://www.matchadesign.com/blog/qr-code-demystified-part-4/
+"""
+
+#Imports required for 2.x support
+from __future__ import absolute_import, division, print_function, with_statement, unicode_literals
+
+import binascii
+import pyqrcode.tables as tables
+
+#: The powers of alpha, repeated twice so that the sum of two logarithms
+#: can be used as an index without taking it modulo 255.
+_exp = tables.galois_log[:255] * 2
+
+#: The logarithm of every non-zero field element.
+_log = tables.galois_antilog
+
+#: Cache of the generator multiplication tables, keyed by the number
+#: of error correction code words.
+_generator_tables = {}
+
+#: Cache of the block plans, keyed by (version, error).
+_block_plans = {}
+
+
+def gf_multiply(a, b):
+    """这个函数返回 GF(256) 中 *a* 和 *b* 两个元素的乘积。"""
+    if a == 0 or b == 0:
+        return 0
+    return _exp[_log[a] + _log[b]]
+
+
+def _int_to_bytes(value, length):
+    """把一个整数转换成 *length* 个字节的大端字节序 `bytes` 字节。"""
+    return binascii.unhexlify('{0:0{1}x}'.format(value, length * 2))
+
+
+def generator_table(ecc_words):
+    """这个函数返回含有 *ecc_words* 个错误纠正码字的生成多项式乘法表。
+
+    数据表中第 `f` 个元素是 `f` 乘以生成多项式（不含首项）的所有系数，
+    这些系数按照大端字节序打包成一个整数。这样在计算余数时，
+    每个数据码字只需要查一次表和做一次异或运算。
+    """
+    table = _generator_tables.get(ecc_words)
+    if table is None:
+        generator = [_exp[alpha] for alpha in
+                     tables.generator_polynomials[ecc_words]]
+        table = [0] * 256
+        for factor in range(1, 256):
+            packed = 0
+            for coefficient in generator:
+                packed = (packed << 8) | gf_multiply(factor, coefficient)
+            table[factor] = packed
+        _generator_tables[ecc_words] = table
+    return table
+
+
+class BlockPlan(object):
+    """这个类描述了一种二维码版本号和错误纠正级别的分块计划。
+    也就是数据码字如何分成数据块，每个数据块有多少个错误纠正码字，
+    以及所有码字如何交错排列。
+
+    不要直接建立这个类的实例，而是使用 :func:`get_block_plan` 函数，
+    这样计划只会计算一次。
+    """
+    #: The generator table as a NumPy array, see encode_many.
+    _generator_array = None
+
+    def __init__(self, version, error):
+        error_info = tables.eccwbi[version][error]
+
+        self.version = version
+        self.error = error
+
+        #The number of error correction code words for every block
+        self.ecc_words = error_info[0]
+
+        #Some codes have the data sliced into two different sized blocks
+        #for example, first two 14 word sized blocks, then four 15 word
+        #sized blocks.
+        self.block_sizes = [error_info[2]] * error_info[1]
+        self.block_sizes.extend([error_info[4]] * error_info[3])
+
+        self.data_words = sum(self.block_sizes)
+        self.total_words = self.data_words + \
+                           self.ecc_words * len(self.block_sizes)
+
+        self._generator = generator_table(self.ecc_words)
+
+        #The blocks are concatenated as: data block 1, data block 2, ...,
+        #error block 1, error block 2, ... This lists the index into that
+        #sequence for every position of the interleaved output. The data
+        #is written block 1 byte 1, block 2 byte 1, etc. then the error
+        #blocks are written the same way.
+        starts = []
+        offset = 0
+        for size in self.block_sizes:
+            starts.append(offset)
+            offset += size
+        order = []
+        for i in range(max(self.block_sizes)):
+            for start, size in zip(starts, self.block_sizes):
+                if i < size:
+                    order.append(start + i)
+        for i in range(self.ecc_words):
+            for n in range(len(self.block_sizes)):
+                order.append(self.data_words + n * self.ecc_words + i)
+        self._order = order
+
+    def split(self, data):
+        """这个方法把数据码字 *data* 分成数据块，
+        返回一个含有 `bytearray` 字节阵列的列表。
+        """
+        blocks = []
+        start = 0
+        for size in self.block_sizes:
+            blocks.append(bytearray(data[start:start+size]))
+            start += size
+        return blocks
+
+    def error_block(self, block):
+        """这个方法返回数据块 *block* 的错误纠正码字，
+        也就是一个 `bytes` 字节对象。
+        余数是像线性反馈移位寄存器那样一个码字一个码字计算出来的。
+        """
+        table = self._generator
+        ecc_words = self.ecc_words
+        mask = (1 << (8 * ecc_words)) - 1
+        shift = 8 * (ecc_words - 1)
+        remainder = 0
+        for word in bytearray(block):
+            remainder = ((remainder << 8) & mask) ^ \
+                        table[(remainder >> shift) ^ word]
+        return _int_to_bytes(remainder, ecc_words)
+
+    def encode(self, data):
+        """这个方法计算二维码中所有数据块的错误纠正码字，
+        然后返回交错排列后的所有码字，是一个 `bytearray` 字节阵列。
+        其中 *data* 参数必须正好含有 `data_words` 个数据码字。
+        """
+        if len(data) != self.data_words:
+            raise ValueError('Expected {0} data code words, got '
+                             '{1}.'.format(self.data_words, len(data)))
+        data = bytearray(data)
+        words = data[:]
+        for block in self.split(data):
+            words.extend(self.error_block(block))
+        return bytearray(map(words.__getitem__, self._order))
+
+    def encode_many(self, data):
+        """这个方法与 :py:meth:`encode` 方法一样，只是一次性计算许多二维码
+        的所有数据块，需要安装 NumPy 模块。
+        其中 *data* 参数是一个 (二维码数, `data_words`) 形状的 `uint8` 阵列，
+        返回一个 (二维码数, `total_words`) 形状的阵列。
+
+        所有数据块都放在一个阵列中，较短的数据块前面补0，
+        这不会改变余数。然后每一步对所有数据块同时查表和做异或运算。
+        """
+        import numpy as np
+
+        count, words = data.shape
+        if words != self.data_words:
+            raise ValueError('Expected {0} data code words, got '
+                             '{1}.'.format(self.data_words, words))
+
+        #One row per block of every code, left padded with zeros
+        width = max(self.block_sizes)
+        blocks = np.zeros((count, len(self.block_sizes), width), np.uint8)
+        start = 0
+        for n, size in enumerate(self.block_sizes):
+            blocks[:, n, width-size:] = data[:, start:start+size]
+            start += size
+        blocks = blocks.reshape(-1, width)
+
+        #The generator table with every coefficient in its own column
+        table = self._generator_array
+        if table is None:
+            table = np.array([[(packed >> (8 * i)) & 0xFF
+                               for i in range(self.ecc_words - 1, -1, -1)]
+                              for packed in self._generator], np.uint8)
+            self._generator_array = table
+
+        remainder = np.zeros((len(blocks), self.ecc_words), np.uint8)
+        for i in range(width):
+            factor = remainder[:, 0] ^ blocks[:, i]
+            remainder[:, :-1] = remainder[:, 1:]
+            remainder[:, -1] = 0
+            remainder ^= table[factor]
+
+        words = np.concatenate((data, remainder.reshape(count, -1)), axis=1)
+        return words[:, self._order]
+
+
+def get_block_plan(version, error):
+    """这个函数返回 *version* 版本号和 *error* 错误纠正级别的
+    :class:`BlockPlan` 分块计划。计划只会计算一次，然后会缓存起来。
+    """
+    key = (version, error)
+    plan = _block_plans.get(key)
+    if plan is None:
+        plan = _block_plans[key] = BlockPlan(version, error)
+    return plan
@@ -53,7 +53,7 @@ setup(name='PyQRCode',
       keywords=['qrcode', 'qr'],
       license='BSD',
       extras_require = {
-        'PNG':  ["pypng>=0.0.13"],
+        'NumPy':  ["numpy"],
       },
       classifiers = [
         'Development Status :: 4 - Beta',
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""\
+Tests against the batch module.
+"""
+from __future__ import unicode_literals
+from nose.tools import eq_, ok_, raises
+from pyqrcode import batch
+import io
+import nose
+import pyqrcode
+
+try:
+    from concurrent import futures
+except ImportError:
+    # Python 2 without the futures backport
+    raise nose.SkipTest('concurrent.futures is not available')
+
+
+_CONTENTS = ['HELLO', 12345, 'Märchen', 'x' * 5000, 'SN-0001']
+
+
+def test_generate_matrices():
+    results = list(batch.generate(_CONTENTS, error='M', backend='thread',
+                                  workers=2, chunksize=2))
+    eq_(list(range(len(_CONTENTS))), [r.index for r in results])
+    for content, result in zip(_CONTENTS, results):
+        eq_(content, result.content)
+        if content == 'x' * 5000:
+            # Too long, the error does not abort the batch
+            ok_(isinstance(result.error, ValueError))
+            eq_(None, result.value)
+        else:
+            eq_(None, result.error)
+            eq_(pyqrcode.create(content, error='M').code, result.value)
+
+
+def test_generate_render():
+    results = batch.generate(['HELLO', 'WORLD'], render='svg',
+                             render_options={'scale': 2}, backend='thread')
+    for result in results:
+        out = io.BytesIO()
+        pyqrcode.create(result.content).svg(out, scale=2)
+        eq_(out.getvalue(), result.value)
+
+    result = next(batch.generate(['HELLO'], render='text', backend='thread'))
+    eq_(pyqrcode.create('HELLO').text(), result.value)
+
+
+def test_generate_processes():
+    contents = ['{0:04d}'.format(n) for n in range(6)]
+    results = list(batch.generate(contents, backend='process', workers=2,
+                                  chunksize=2, ordered=False))
+    eq_(sorted(contents), sorted(r.content for r in results))
+    for result in results:
+        eq_(contents[result.index], result.content)
+        eq_(pyqrcode.create(result.content).code, result.value)
+
+
+def test_generate_executor():
+    with futures.ThreadPoolExecutor(1) as executor:
+        results = list(batch.generate(['A', 'B'], backend=executor))
+        eq_(['A', 'B'], [r.content for r in results])
+        # The executor was not shut down
+        eq_(1, executor.submit(len, 'x').result())
+
+
+def test_generate_backpressure():
+    read = []
+
+    def contents():
+        for n in range(100):
+            read.append(n)
+            yield n
+
+    results = batch.generate(contents(), backend='thread', workers=1,
+                             chunksize=2, max_pending=1)
+    eq_([], read)
+    eq_(0, next(results).index)
+    # The first chunk and the chunk submitted in its place
+    eq_(4, len(read))
+    results.close()
+
+
+def test_generate_starts_executor_lazily():
+    created = []
+    thread_pool = futures.ThreadPoolExecutor
+
+    class Executor(thread_pool):
+        def __init__(self, *args):
+            created.append(self)
+            thread_pool.__init__(self, *args)
+
+    futures.ThreadPoolExecutor = Executor
+    try:
+        results = batch.generate(['A', 'B'], backend='thread')
+        eq_([], created)
+        eq_(['A', 'B'], [r.content for r in results])
+        eq_(1, len(created))
+    finally:
+        futures.ThreadPoolExecutor = thread_pool
+
+
+def test_generate_failed_chunk():
+    class FailingExecutor(object):
+        def submit(self, fn, *args):
+            future = futures.Future()
+            future.set_exception(RuntimeError('The worker died'))
+            return future
+
+    results = list(batch.generate(['A', 'B', 'C'], backend=FailingExecutor(),
+                                  chunksize=2, ordered=False))
+    eq_([0, 1, 2], sorted(r.index for r in results))
+    for result in results:
+        eq_(None, result.value)
+        ok_(isinstance(result.error, RuntimeError))
+
+
+@raises(ValueError)
+def test_generate_invalid_backend():
+    batch.generate(['A'], backend='fibers')
+
+
+@raises(ValueError)
+def test_generate_invalid_renderer():
+    batch.generate(['A'], render='gif')
+
+
+@raises(ValueError)
+def test_generate_invalid_error():
+    batch.generate(['A'], error='R')
+
+
+if __name__ == '__main__':
+    import nose
+    nose.core.runmodule()
@@ -2,9 +2,11 @@
 """\
 Test against the buidler module.
 """
-from __future__ import unicode_literals
+from __future__ import unicode_literals, division
 from nose.tools import ok_, eq_, raises
-from pyqrcode import builder
+from pyqrcode import builder, tables
+import itertools
+import nose
 
 
 def test_illegal_mode():
@@ -31,6 +33,319 @@ def test_illegal_version():
         ok_('41' in str(ex))
 
 
+def test_bitstream_write():
+    buf = builder.BitStream()
+    buf.write(4, 4)
+    buf.write(5, 8)
+    buf.write(0x3F, 6)
+    eq_(18, len(buf))
+    eq_('010000000101111111', buf.getvalue())
+    eq_(b'\x40\x5f\xc0', buf.tobytes())
+
+
+def test_bitstream_write_bytes_unaligned():
+    buf = builder.BitStream()
+    buf.write(1, 3)
+    buf.write_bytes(b'\xff\x00')
+    eq_(19, len(buf))
+    eq_('0011111111100000000', buf.getvalue())
+    eq_([0, 0, 1, 1, 1], list(buf.bits())[:5])
+
+
+def test_bitstream_write_bytes_buffers():
+    data = bytes(bytearray(range(256)))
+    for offset in range(8):
+        expected = builder.BitStream()
+        expected.write(5, offset)
+        for byte in bytearray(data):
+            expected.write(byte, 8)
+        for payload in (data, bytearray(data), memoryview(data)):
+            buf = builder.BitStream()
+            buf.write(5, offset)
+            buf.write_bytes(payload)
+            eq_(expected.getvalue(), buf.getvalue())
+            eq_(expected.tobytes(), buf.tobytes())
+
+
+def test_mask_bitmaps_cover_data_only():
+    qr = builder.QRCodeBuilder('HELLO WORLD', version=1, mode='alphanumeric',
+                               error='M')
+    bitmaps = [builder.Matrix.from_int(bitmap, 21)
+               for bitmap in builder._mask_bitmaps[1]]
+    eq_(8, len(bitmaps))
+    for bitmap in bitmaps:
+        # Finder pattern, separator and type area of the upper left corner
+        for row in range(9):
+            eq_([0] * 9, list(bitmap[row][:9]))
+        # Timing pattern
+        eq_([0] * 21, [r[6] for r in bitmap])
+    # Mask 1 flips the data modules of every even row
+    eq_([0] * 9 + [1] * 4 + [0] * 8, list(bitmaps[1][0]))
+
+
+def test_masks_differ_by_bitmap():
+    qr = builder.QRCodeBuilder('HELLO WORLD', version=1, mode='alphanumeric',
+                               error='M')
+    bitmaps = builder._mask_bitmaps[1]
+    type_area = builder._get_type_bits(1, 'M', 0) | \
+                builder._get_type_bits(1, 'M', 5)
+    # The template reserves the type area with light modules
+    eq_(0, qr.make_template().to_int() & type_area)
+    # Outside of the type area, two masks only differ by their bitmaps
+    eq_((qr.mask_bits[0] ^ bitmaps[0]) & ~type_area,
+        (qr.mask_bits[5] ^ bitmaps[5]) & ~type_area)
+    eq_(qr.masks[5], builder.Matrix.from_int(qr.mask_bits[5], 21))
+
+
+def test_data_positions():
+    qr = builder.QRCodeBuilder('HELLO WORLD', version=2, mode='alphanumeric',
+                               error='M')
+    rows, cols = builder._data_positions[2]
+    # 44 code words and 7 remainder bits
+    eq_(44 * 8 + 7, len(rows))
+    eq_(len(rows), len(cols))
+    # Placement starts in the lower right corner, moving up
+    eq_([(24, 24), (24, 23), (23, 24)], list(zip(rows, cols))[:3])
+    eq_(len(rows), len(set(zip(rows, cols))))
+    positions = builder._get_data_positions(2, None)
+    ok_(positions[0] is rows)
+
+
+def test_template_is_cached_and_unchanged():
+    qr = builder.QRCodeBuilder('123', version=7, mode='numeric', error='M')
+    template = builder._templates[7]
+    ok_(template is qr.make_template())
+    snapshot = template.copy()
+    builder.QRCodeBuilder('456', version=7, mode='numeric', error='H')
+    eq_(snapshot, template)
+    # Only the data modules are left unset
+    unset = sum(row.count(bytearray([builder._UNSET])) for row in template)
+    eq_(len(builder._data_positions[7][0]), unset)
+
+
+def test_type_overlay():
+    overlay = builder._get_type_overlay('M', 5)
+    eq_(30, len(overlay))
+    bits = tables.type_bits['M'][5]
+    eq_((8, 0, int(bits[0])), overlay[0])
+    eq_((-1, 8, int(bits[0])), overlay[1])
+    eq_((8, -1, int(bits[-1])), overlay[-2])
+    eq_((0, 8, int(bits[-1])), overlay[-1])
+
+
+def test_matrix():
+    m = builder.Matrix([[1, 1, 1], [0, 0, 1], [1, 0, 0]])
+    eq_(3, len(m))
+    eq_(3, m.size)
+    eq_([[1, 1, 1], [0, 0, 1], [1, 0, 0]], m)
+    eq_(1, m[2][0])
+    eq_([1, 1, 1], list(m[0]))
+    eq_([7, 1, 4], m.row_bits())
+    eq_([5, 4, 6], m.column_bits())
+    eq_(0b111001100, m.to_int())
+    eq_(m, builder.Matrix.from_int(m.to_int(), 3))
+    eq_(b'\x01\x01\x01\x00\x00\x01\x01\x00\x00', m.tobytes())
+    eq_([[1, 1, 1], [0, 0, 1], [1, 0, 0]], m.tolist())
+    eq_(m.column_bits(), m.transpose().row_bits())
+    ok_(m != builder.Matrix.blank(3))
+
+
+def test_matrix_unset_module():
+    m = builder.Matrix.blank(2)
+    m[0][1] = ' '
+    eq_(builder._UNSET, m[0][1])
+    eq_(0, m.to_int())
+    m[0][1] = 1
+    eq_(0b0100, m.to_int())
+
+
+def _reference_scores(m):
+    """Scores the penalty rules module by module."""
+    n = len(m)
+    lines = [list(row) for row in m] + [[m[r][c] for r in range(n)]
+                                        for c in range(n)]
+    rule1 = 0
+    rule3 = 0
+    patterns = [[0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+                [1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0]]
+    for line in lines:
+        for key, group in itertools.groupby(line):
+            length = len(list(group))
+            if length >= 5:
+                rule1 += 3 + length - 5
+        for i in range(n - 10):
+            if line[i:i + 11] in patterns:
+                rule3 += 40
+    rule2 = 3 * sum(1 for r in range(n - 1) for c in range(n - 1)
+                    if m[r][c] == m[r + 1][c] == m[r][c + 1] == m[r + 1][c + 1])
+    percent = sum(map(sum, m)) / (n * n) * 100 - 50
+    return [rule1, rule2, rule3, int((abs(int(percent)) / 5) * 10)]
+
+
+def test_penalty_scores():
+    for data, version, mode, error in (('HELLO WORLD', 1, 'alphanumeric', 'Q'),
+                                       ('0123456789' * 8, 5, 'numeric', 'H'),
+                                       ('Penalty test', 12, 'binary', 'L')):
+        code = builder.QRCodeBuilder(data, version, mode, error)
+        for n, mask in enumerate(code.masks):
+            eq_(_reference_scores(mask), code.scores[n])
+            eq_(builder.Matrix.from_int(code.mask_columns[n], len(mask)),
+                mask.transpose())
+
+
+def test_transpose_bits():
+    m = builder.Matrix([[1, 1, 1], [0, 0, 1], [1, 0, 0]])
+    eq_(m.transpose().to_int(), builder._transpose_bits(m.to_int(), 3))
+
+
+def test_numpy_scoring():
+    if builder._get_numpy() is None:
+        raise nose.SkipTest()
+    for version, error in ((1, 'H'), (9, 'M'), (27, 'L')):
+        expected = builder.QRCodeBuilder('Backend', version, 'binary', error)
+        code = builder.QRCodeBuilder('Backend', version, 'binary', error,
+                                     scoring='numpy')
+        eq_('numpy', code.scoring)
+        eq_(expected.scores, code.scores)
+        eq_(expected.best_mask, code.best_mask)
+
+
+def test_numpy_scoring_random_masks():
+    if builder._get_numpy() is None:
+        raise nose.SkipTest()
+    size = tables.version_size[5]
+    masks = [builder.Matrix([[(row * col + n) % 3 == 0 or (row ^ n) % 5 == 0
+                              for col in range(size)] for row in range(size)])
+             for n in range(70)]
+    bits = [m.to_int() for m in masks]
+    columns = [builder._transpose_bits(b, size) for b in bits]
+    eq_(builder._score_masks(bits, columns, size),
+        builder._score_masks_numpy(bits, columns, size))
+
+
+def test_build_many_numpy():
+    if builder._get_numpy() is None:
+        raise nose.SkipTest()
+    codes = [('{0:04d}'.format(n * 37), 'numeric') for n in range(70)]
+    codes.append(([('alphanumeric', 'SN-'), ('numeric', '0042')], 'mixed'))
+    codes.append(('Märchen', 'binary'))
+    for version, error in ((1, 'H'), (7, 'M'), (25, 'L')):
+        for mask in (None, 'bound', 5):
+            built = builder._build_many_numpy(codes, version, error, mask)
+            eq_(len(codes), len(built))
+            for (data, mode), matrix in zip(codes, built):
+                expected = builder.QRCodeBuilder(data, version, mode, error,
+                                                 mask=mask)
+                eq_(expected.code, matrix)
+
+
+@raises(ValueError)
+def test_build_many_numpy_callable_mask():
+    if builder._get_numpy() is None:
+        raise nose.SkipTest()
+    builder._build_many_numpy([('1', 'numeric')], 1, 'M', lambda code: 0)
+
+
+def test_scoring_fallback():
+    numpy = builder._get_numpy()
+    builder._numpy = None
+    try:
+        code = builder.QRCodeBuilder('Backend', 1, 'binary', 'M',
+                                     scoring='numpy')
+    finally:
+        builder._numpy = numpy
+    eq_('python', code.scoring)
+
+
+@raises(ValueError)
+def test_illegal_scoring():
+    builder.QRCodeBuilder('Backend', 1, 'binary', 'M', scoring='fortran')
+
+
+def test_bound_mask_strategy():
+    for data, version, error in (('Bound', 1, 'H'), ('Bound', 8, 'Q'),
+                                 ('Branch and bound', 23, 'L')):
+        expected = builder.QRCodeBuilder(data, version, 'binary', error)
+        code = builder.QRCodeBuilder(data, version, 'binary', error,
+                                     mask='bound')
+        eq_(expected.best_mask, code.best_mask)
+        eq_(expected.scores[code.best_mask], code.scores[code.best_mask])
+        for n, scores in enumerate(code.scores):
+            ok_(scores is None or scores == expected.scores[n])
+
+
+def test_forced_mask():
+    code = builder.QRCodeBuilder('Forced', 2, 'binary', 'M', mask=6)
+    eq_(6, code.best_mask)
+    eq_([None] * 8, code.scores)
+    eq_(builder.Matrix.from_int(code.mask_bits[6], 25), code.code)
+
+
+def test_callable_mask_strategy():
+    code = builder.QRCodeBuilder('Callable', 2, 'binary', 'M',
+                                 mask=lambda code: 3)
+    eq_(3, code.best_mask)
+
+
+@raises(ValueError)
+def test_illegal_mask():
+    builder.QRCodeBuilder('Forced', 2, 'binary', 'M', mask=8)
+
+
+@raises(ValueError)
+def test_illegal_mask_strategy():
+    builder.QRCodeBuilder('Forced', 2, 'binary', 'M', mask='random')
+
+
+def test_pick_version():
+    numeric = tables.modes['numeric']
+    eq_(1, builder._pick_version('1' * 17, numeric, 'H'))
+    eq_(2, builder._pick_version('1' * 18, numeric, 'H'))
+    # Exactly fills version 27-L, the capacity table only allows 3514
+    eq_(27, builder._pick_version('1' * 3517, numeric, 'L'))
+    eq_(28, builder._pick_version('1' * 3518, numeric, 'L'))
+    eq_(40, builder._pick_version('1' * 7089, numeric, 'L'))
+
+
+def test_pick_version_length_field():
+    binary = tables.modes['binary']
+    # Fills version 9-L only with its 8 bit length field, the 16 bit
+    # field of version 10+ would need 8 more bits
+    eq_(9, builder._pick_version('x' * 230, binary, 'L'))
+    eq_(10, builder._pick_version('x' * 231, binary, 'L'))
+
+
+@raises(ValueError)
+def test_pick_version_too_long():
+    builder._pick_version('1' * 7090, tables.modes['numeric'], 'L')
+
+
+def test_make_segments():
+    eq_([('binary', b'https://example.com/'), ('numeric', '1234567890123')],
+        builder._make_segments('https://example.com/1234567890123', 1,
+                               'iso-8859-1'))
+    eq_([('alphanumeric', 'A '), ('kanji', '点字'.encode('shiftjis'))],
+        builder._make_segments('A 点字', 1, 'iso-8859-1'))
+    # A short run of digits is not worth a new segment
+    eq_([('alphanumeric', 'AB12CD')],
+        builder._make_segments('AB12CD', 1, 'iso-8859-1'))
+    eq_([], builder._make_segments('', 1, 'iso-8859-1'))
+
+
+@raises(ValueError)
+def test_make_segments_unencodable():
+    builder._make_segments('\u263a', 1, 'iso-8859-1')
+
+
+def test_mixed_builder():
+    code = builder.QRCodeBuilder([('alphanumeric', 'SN '),
+                                  ('numeric', '0123456789')], 1, 'mixed', 'M')
+    eq_([(2, 'SN '), (1, '0123456789')], code.segments)
+    # Mode, 9 bit length and 3 characters, then mode, 10 bit length and
+    # 10 digits
+    eq_('0010' '000000011' '10100000011' '100100',
+        code.buffer.getvalue()[:30])
+
 
 if __name__ == '__main__':
     import nose
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""\
+Tests against the cache module and the matrix cache of QRCode.
+"""
+from __future__ import unicode_literals
+from nose.tools import eq_, ok_, raises
+from pyqrcode import cache
+import io
+import threading
+import pyqrcode
+
+
+def _with_cache(max_size=1024 * 1024):
+    def decorator(func):
+        def wrapper():
+            pyqrcode.matrix_cache = cache.MatrixCache(max_size)
+            try:
+                func()
+            finally:
+                pyqrcode.matrix_cache = None
+        wrapper.__name__ = func.__name__
+        return wrapper
+    return decorator
+
+
+@_with_cache()
+def test_cache_hit():
+    url = 'https://example.com/pay'
+    expected = pyqrcode.create(url).code
+    eq_((0, 1), pyqrcode.matrix_cache.info()[:2])
+    qr = pyqrcode.create(url)
+    eq_(expected, qr.code)
+    eq_((1, 1, 0, 1), pyqrcode.matrix_cache.info()[:4])
+    # The matrix was not built again
+    ok_(qr._builder is None)
+
+
+@_with_cache()
+def test_cache_key():
+    pyqrcode.create('HELLO', error='M').code
+    pyqrcode.create('HELLO', error='L').code
+    pyqrcode.create('HELLO', error='M', version=2).code
+    pyqrcode.create('HELLO', error='M', mode='binary').code
+    pyqrcode.create('HELLO', error='M', mask=3).code
+    eq_(0, pyqrcode.matrix_cache.info().hits)
+    eq_(5, len(pyqrcode.matrix_cache))
+    # Bytes, a bytearray and a memoryview have the same key
+    for content in (b'\xff\x00', bytearray(b'\xff\x00'),
+                    memoryview(b'\xff\x00')):
+        pyqrcode.create(content).code
+    eq_(2, pyqrcode.matrix_cache.info().hits)
+    # The same segments give the same matrix, however they were given
+    pyqrcode.QRCode.from_segments([('alphanumeric', 'HELLO')], 'M').code
+    eq_(3, pyqrcode.matrix_cache.info().hits)
+
+
+@_with_cache()
+def test_cache_copies():
+    qr = pyqrcode.create('COPY')
+    qr.code[0][0] = 0
+    eq_(1, pyqrcode.create('COPY').code[0][0])
+
+
+def test_cache_eviction():
+    matrix_cache = cache.MatrixCache(0)
+    key = ((('binary', b'x'),), 'M', 1, None)
+    matrix_cache.put(key, b'\x01' * 441)
+    # Too large to be cached at all
+    eq_(0, len(matrix_cache))
+
+    size = matrix_cache._get_size(key, b'\x01' * 441)
+    matrix_cache = cache.MatrixCache(2 * size)
+    for n in range(3):
+        key = ((('binary', b'x'),), 'M', 1, n)
+        matrix_cache.put(key, b'\x01' * 441)
+    info = matrix_cache.info()
+    eq_(1, info.evictions)
+    eq_(2, info.entries)
+    eq_(2 * size, info.size)
+    # The least recently used entry was removed
+    eq_(None, matrix_cache.get(((('binary', b'x'),), 'M', 1, 0)))
+
+
+def test_cache_threads():
+    matrix_cache = cache.MatrixCache(64 * 1024)
+
+    def worker(n):
+        for i in range(200):
+            key = ((('numeric', str(i % 50)),), 'M', 1, n)
+            if matrix_cache.get(key) is None:
+                matrix_cache.put(key, b'\x00' * 441)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    info = matrix_cache.info()
+    eq_(800, info.hits + info.misses)
+    ok_(info.size <= info.max_size)
+    eq_(info.entries, len(matrix_cache))
+
+
+@raises(ValueError)
+def test_cache_negative_size():
+    cache.MatrixCache(-1)
+
+
+def test_digest():
+    a = pyqrcode.create('HELLO')
+    b = pyqrcode.QRCode.from_segments([('alphanumeric', 'HELLO')])
+    c = pyqrcode.create('HELLO', error='L')
+    eq_(64, len(a.digest))
+    eq_(a.digest, b.digest)
+    eq_(a, b)
+    ok_(a != c)
+    eq_(2, len(set([a, b, c])))
+
+
+def test_render_cache():
+    renders = cache.RenderCache()
+    qr = pyqrcode.create('RENDER')
+    for kind in ('png', 'svg'):
+        expected = io.BytesIO()
+        getattr(qr, kind)(expected, scale=3)
+        for n in range(2):
+            out = io.BytesIO()
+            getattr(qr, kind)(out, scale=3, cache=renders)
+            eq_(expected.getvalue(), out.getvalue())
+    eq_((2, 2, 0, 2), renders.info()[:4])
+    # The base64 string uses the cached PNG, then it is cached itself
+    expected = qr.png_as_base64_str(scale=3)
+    eq_(expected, qr.png_as_base64_str(scale=3, cache=renders))
+    eq_((3, 3), renders.info()[:2])
+    eq_(expected, qr.png_as_base64_str(scale=3.5, cache=renders))
+    eq_((4, 3), renders.info()[:2])
+    # An equal code from other content shares the entries
+    other = pyqrcode.QRCode.from_segments([('alphanumeric', 'RENDER')])
+    other.svg(io.BytesIO(), scale=3, cache=renders)
+    eq_(5, renders.info().hits)
+
+
+def test_render_cache_options():
+    renders = cache.RenderCache()
+    qr = pyqrcode.create('OPTIONS')
+    qr.png(io.BytesIO(), scale=2, module_color=(0, 0, 0), cache=renders)
+    # Equal PNG options once they are converted
+    qr.png(io.BytesIO(), scale=2.5, module_color='#000', cache=renders)
+    qr.png(io.BytesIO(), scale=2, module_color=[0, 0, 0, 255],
+           cache=renders)
+    eq_((2, 1), renders.info()[:2])
+    qr.png(io.BytesIO(), scale=2, background=None, cache=renders)
+    eq_(2, renders.info().misses)
+    # SVG writes 2 and 2.0 differently
+    for scale in (2, 2.0):
+        expected = io.BytesIO()
+        qr.svg(expected, scale=scale)
+        out = io.BytesIO()
+        qr.svg(out, scale=scale, cache=renders)
+        eq_(expected.getvalue(), out.getvalue())
+    eq_(4, renders.info().misses)
+
+
+def test_render_cache_budget():
+    qr = pyqrcode.create('BUDGET')
+    out = io.BytesIO()
+    qr.svg(out)
+    renders = cache.RenderCache(len(out.getvalue()) // 2)
+    qr.svg(io.BytesIO(), cache=renders)
+    # Larger than the whole cache
+    eq_(0, len(renders))
+
+
+if __name__ == '__main__':
+    import nose
+    nose.core.runmodule()
@@ -5,7 +5,9 @@ PNG related tests.
 from __future__ import unicode_literals, absolute_import
 import io
 import os
-from nose.tools import eq_, raises
+import zlib
+import nose
+from nose.tools import eq_, ok_, raises
 import pyqrcode
 import png
 
@@ -153,6 +155,140 @@ def test_hexcolor_too_long_background():
     qr.png(io.BytesIO(), background='#0000000')
 
 
+def test_png_scaled_pixels():
+    qr = pyqrcode.create('SCALE')
+    scale, quiet_zone = 13, 3
+    out = io.BytesIO()
+    qr.png(out, scale=scale, quiet_zone=quiet_zone)
+    out.seek(0)
+    width, height, pixels = _get_png_info(file=out)
+    eq_(qr.get_png_size(scale, quiet_zone), width)
+    eq_(width, height)
+    for y, row in enumerate(pixels):
+        for x, pixel in enumerate(row):
+            module = None
+            r, c = y // scale - quiet_zone, x // scale - quiet_zone
+            if 0 <= r < len(qr.code) and 0 <= c < len(qr.code):
+                module = qr.code[r][c]
+            eq_(0 if module == 1 else 1, pixel)
+
+
+def test_png_modes():
+    qr = pyqrcode.create('MODES')
+    for options, greyscale, bitdepth, color in (
+            ({'background': None}, True, 1, None),
+            ({'module_color': '#f00'}, False, 1, (255, 0, 0, 255)),
+            # Red error modules need a palette, even in black and white
+            ({'debug': True}, False, 2, (255, 0, 0, 255))):
+        out = io.BytesIO()
+        pyqrcode.builder._png(qr.code, qr.version, out, 2, **options)
+        reader = png.Reader(bytes=out.getvalue())
+        w, h, pixels, meta = reader.read()
+        list(pixels)
+        eq_(greyscale, meta['greyscale'])
+        eq_(bitdepth, meta['bitdepth'])
+        if greyscale:
+            eq_((1,), meta['transparent'])
+        else:
+            ok_(color in meta['palette'])
+
+
+def test_png_streaming():
+    try:
+        import tracemalloc
+    except ImportError:
+        raise nose.SkipTest('tracemalloc is not available')
+    qr = pyqrcode.create('STREAM', version=10)
+    qr.code
+    scale = 60
+    size = qr.get_png_size(scale)
+    out = io.BytesIO()
+    tracemalloc.start()
+    try:
+        qr.png(out, scale=scale)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Less than half of the packed bitmap was ever held in memory
+    ok_(peak < size * size // 8 // 2)
+
+
+def test_png_idat_chunks():
+    def idat_chunks(data):
+        reader = png.Reader(bytes=data)
+        return [chunk for tag, chunk in reader.chunks() if tag == b'IDAT']
+
+    qr = pyqrcode.create('CHUNKS', version=10)
+    expected = io.BytesIO()
+    qr.png(expected, scale=60)
+    idat_size = pyqrcode.builder._png_idat_size
+    pyqrcode.builder._png_idat_size = 16
+    try:
+        out = io.BytesIO()
+        qr.png(out, scale=60)
+    finally:
+        pyqrcode.builder._png_idat_size = idat_size
+    chunks = idat_chunks(out.getvalue())
+    ok_(len(chunks) > 1)
+    eq_(zlib.decompress(b''.join(idat_chunks(expected.getvalue()))),
+        zlib.decompress(b''.join(chunks)))
+
+
+def test_png_compression_options():
+    qr = pyqrcode.create('COMPRESSION')
+    expected = io.BytesIO()
+    qr.png(expected, scale=3)
+    expected.seek(0)
+    expected = _get_png_info(file=expected)
+    for options in ({'compression': 0}, {'compression': 9},
+                    {'strategy': 'rle'}, {'strategy': 'huffman'},
+                    {'row_filter': 'sub'}, {'row_filter': 'up'},
+                    {'row_filter': 'average'}, {'row_filter': 'paeth'},
+                    {'row_filter': 'adaptive', 'strategy': 'filtered'}):
+        out = io.BytesIO()
+        qr.png(out, scale=3, **options)
+        out.seek(0)
+        eq_(expected, _get_png_info(file=out))
+
+
+def test_png_optimize():
+    def rgba(data):
+        w, h, pixels, meta = png.Reader(bytes=data).asRGBA8()
+        return [list(row) for row in pixels]
+
+    qr = pyqrcode.create('OPTIMIZE')
+    for colors, greyscale, transparent in (
+            (((255, 255, 255), (0, 0, 0)), True, False),
+            (((0, 0, 0), (255, 255, 255, 0)), True, True),
+            (('#f00', '#fff'), False, False),
+            (((0, 0, 255), None), False, True),
+            (((0, 0, 0, 128), (255, 255, 255)), False, True)):
+        expected = io.BytesIO()
+        qr.png(expected, module_color=colors[0], background=colors[1])
+        out = io.BytesIO()
+        qr.png(out, module_color=colors[0], background=colors[1],
+               optimize=True)
+        ok_(len(out.getvalue()) <= len(expected.getvalue()))
+        eq_(rgba(expected.getvalue()), rgba(out.getvalue()))
+        eq_(greyscale, png.Reader(bytes=out.getvalue()).read()[3]['greyscale'])
+        eq_(transparent, b'tRNS' in out.getvalue())
+
+
+@raises(ValueError)
+def test_png_invalid_compression():
+    pyqrcode.create('test').png(io.BytesIO(), compression=10)
+
+
+@raises(ValueError)
+def test_png_invalid_strategy():
+    pyqrcode.create('test').png(io.BytesIO(), strategy='zopfli')
+
+
+@raises(ValueError)
+def test_png_invalid_row_filter():
+    pyqrcode.create('test').png(io.BytesIO(), row_filter='median')
+
+
 def png_as_matrix(buff, quiet_zone):
     """\
     Reads the PNG from the provided buffer and returns the code matrix (list
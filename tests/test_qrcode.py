@@ -69,6 +69,36 @@ def test_binary_data():
     eq_('binary', qr.mode)
 
 
+def test_binary_buffers():
+    data = 'Märchenbuch'.encode('utf-8')
+    expected = pyqrcode.create(data, encoding='utf-8')
+    for content in (bytearray(data), memoryview(data)):
+        qr = pyqrcode.create(content, encoding='utf-8')
+        eq_('binary', qr.mode)
+        eq_('Märchenbuch', qr.data)
+        eq_(expected.version, qr.version)
+        eq_(expected.code, qr.code)
+
+
+def test_binary_buffer_copied():
+    data = bytearray(b'hello world')
+    qr = pyqrcode.create(data, error='L')
+    data.extend(b'x' * 400)
+    eq_('hello world', qr.data)
+    eq_(pyqrcode.create(b'hello world', error='L').code, qr.code)
+
+
+def test_binary_payload_as_is():
+    # UTF-8 bytes are encoded as they are, like a UTF-8 encoded string
+    qr = pyqrcode.create('Märchenbuch'.encode('utf-8'), encoding='utf-8')
+    eq_(pyqrcode.create('Märchenbuch', encoding='utf-8').code, qr.code)
+    # Bytes that cannot be decoded are still encodable
+    data = b'\x80\xff\xfe\x00'
+    qr = pyqrcode.create(data, encoding='utf-8')
+    eq_('binary', qr.mode)
+    eq_(data, qr.data)
+
+
 def test_unicode_utf8():
     s = '\u263A'  # ☺ (WHITE SMILING FACE)
     try:
@@ -178,6 +208,156 @@ def test_invalid_ecc():
     pyqrcode.create('test', error='R')
 
 
+def test_mask_strategy():
+    expected = pyqrcode.create('Mask strategy')
+    qr = pyqrcode.create('Mask strategy', mask='bound')
+    eq_(expected.code, qr.code)
+    qr = pyqrcode.create('Mask strategy', mask=2)
+    eq_(2, qr.builder.best_mask)
+
+
+@raises(ValueError)
+def test_invalid_mask():
+    pyqrcode.create('test', mask=-1)
+
+
+def test_lazy_build():
+    qr = pyqrcode.create('HELLO WORLD', error='Q')
+    eq_(1, qr.version)
+    eq_(4 + 9 + 61, qr.bit_length)
+    eq_([13], qr.blocks.block_sizes)
+    eq_(29, qr.get_png_size())
+    ok_(qr._builder is None)
+    eq_(21, len(qr.code))
+    ok_(qr._builder is not None)
+    ok_(qr.code is qr.builder.code)
+
+
+@raises(ValueError)
+def test_lazy_build_invalid_scoring():
+    pyqrcode.create('test', scoring='fortran')
+
+
+def test_unicode_digits_are_binary():
+    # str.isdigit() accepts these, but numeric mode cannot encode them
+    qr = pyqrcode.create('²³')
+    eq_('binary', qr.mode)
+    eq_(21, len(qr.code))
+
+
+def test_kanji_characters():
+    kanji = pyqrcode.builder._get_kanji_characters()
+    for c in '点茗漢字外来語':
+        ok_(c in kanji)
+    for c in 'Aｱ¥\u00e4\ufffd':
+        ok_(c not in kanji)
+
+
+def test_mixed_mode():
+    s = 'https://example.com/shipment/12345678901234567890'
+    qr = pyqrcode.create(s, error='M', mode='mixed')
+    eq_('mixed', qr.mode)
+    eq_([('binary', b'https://example.com/shipment/'),
+         ('numeric', '12345678901234567890')], qr.segments)
+    ok_(qr.bit_length < pyqrcode.create(s, error='M').bit_length)
+    eq_(qr.version * 4 + 17, len(qr.code))
+
+
+def test_mixed_mode_kanji():
+    qr = pyqrcode.create('ORDER 点漢字', mode='mixed')
+    eq_(['alphanumeric', 'kanji'], [mode for mode, data in qr.segments])
+    ok_(qr.code)
+
+
+def test_mixed_mode_version():
+    qr = pyqrcode.create('SN 0123456789', mode='mixed', version=12)
+    eq_(12, qr.version)
+    eq_(65, len(qr.code))
+
+
+def test_from_segments():
+    segments = [('alphanumeric', 'SN-'), ('numeric', '0123456789')]
+    qr = pyqrcode.QRCode.from_segments(segments, error='M')
+    eq_('mixed', qr.mode)
+    eq_(segments, qr.segments)
+    eq_(1, qr.version)
+    eq_(4 + 9 + 17 + 4 + 10 + 34, qr.bit_length)
+    eq_(pyqrcode.create('SN-0123456789', error='M', mode='mixed').code,
+        qr.code)
+
+
+def test_from_segments_encodes_strings():
+    qr = pyqrcode.QRCode.from_segments([('binary', 'Märchen'),
+                                        ('kanji', '点')], version=3)
+    eq_([('binary', 'Märchen'.encode('iso-8859-1')),
+         ('kanji', '点'.encode('shiftjis'))], qr.segments)
+    eq_(3, qr.version)
+    eq_(29, len(qr.code))
+
+
+@raises(ValueError)
+def test_from_segments_invalid_mode():
+    pyqrcode.QRCode.from_segments([('alpha', 'ABC')])
+
+
+@raises(ValueError)
+def test_from_segments_version_too_small():
+    pyqrcode.QRCode.from_segments([('numeric', '1' * 40)], version=1)
+
+
+@raises(ValueError)
+def test_from_segments_version_length_fields():
+    # Fits version 9, but the wider length fields of version 10 do not fit
+    segments = [('binary', b'abc')] * 50
+    eq_(9, pyqrcode.QRCode.from_segments(segments, error='L').version)
+    pyqrcode.QRCode.from_segments(segments, error='L', version=10)
+
+
+def test_create_many():
+    contents = ['HELLO', 12345, 'Märchen']
+    codes = list(pyqrcode.create_many(iter(contents), error='M'))
+    eq_(3, len(codes))
+    for content, qr in zip(contents, codes):
+        expected = pyqrcode.create(content, error='M')
+        eq_(expected.mode, qr.mode)
+        eq_(expected.version, qr.version)
+        eq_(expected.code, qr.code)
+
+
+def test_create_many_matrices():
+    contents = ('{0:05d}'.format(n) for n in range(3))
+    matrices = list(pyqrcode.create_many(contents, version=2,
+                                         matrices=True))
+    eq_([pyqrcode.create('{0:05d}'.format(n), version=2).code
+         for n in range(3)], matrices)
+
+
+def test_create_many_is_lazy():
+    def contents():
+        yield 'A'
+        raise Exception('Read too far')
+    codes = pyqrcode.create_many(contents())
+    eq_('alphanumeric', next(codes).mode)
+
+
+def test_create_many_numpy():
+    contents = ['TICKET-{0:04d}'.format(n) for n in range(40)]
+    contents += ['x', 'https://example.com/' + 'a' * 80, 'SN-0042']
+    expected = list(pyqrcode.create_many(contents, matrices=True))
+    matrices = list(pyqrcode.create_many(contents, matrices=True,
+                                         scoring='numpy'))
+    eq_(expected, matrices)
+
+    mixed = ['SN-{0:06d}'.format(n) for n in range(3)]
+    eq_([pyqrcode.create(content, mode='mixed').code for content in mixed],
+        list(pyqrcode.create_many(mixed, mode='mixed', scoring='numpy',
+                                  matrices=True)))
+
+@raises(ValueError)
+def test_create_many_invalid_error():
+    # The options are checked before any content is read
+    pyqrcode.create_many(None, error='R')
+
 if __name__ == '__main__':
     import nose
     nose.core.runmodule()
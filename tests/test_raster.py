@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""\
+Tests against the raw pixel buffers of QRCode.raster.
+"""
+from __future__ import unicode_literals
+from nose.tools import eq_, raises
+import nose
+import pyqrcode
+
+
+def _modules(code, scale, quiet_zone):
+    """\
+    Returns the rows of the expected image, True for dark pixels.
+    """
+    size = len(code)
+    rows = []
+    for y in range((size + 2 * quiet_zone) * scale):
+        r = y // scale - quiet_zone
+        row = []
+        for x in range((size + 2 * quiet_zone) * scale):
+            c = x // scale - quiet_zone
+            row.append(0 <= r < size and 0 <= c < size and code[r][c] == 1)
+        rows.append(row)
+    return rows
+
+
+def test_raster_modes():
+    qr = pyqrcode.create('RASTER')
+    scale, quiet_zone = 3, 2
+    expected = _modules(qr.code, scale, quiet_zone)
+    size = qr.get_png_size(scale, quiet_zone)
+    for mode, stride in (('1', (size + 7) // 8), ('L', size),
+                         ('RGBA', 4 * size)):
+        raster = qr.raster(scale, quiet_zone, mode)
+        eq_((size, size, stride, mode), raster[1:])
+        eq_(size * stride, len(raster.data))
+        data = bytearray(raster.data)
+        rows = []
+        for y in range(size):
+            line = data[y * stride:(y + 1) * stride]
+            if mode == '1':
+                rows.append([not (line[x // 8] >> (7 - x % 8)) & 1
+                             for x in range(size)])
+            elif mode == 'L':
+                rows.append([pixel == 0 for pixel in line])
+            else:
+                rows.append([pixel == (0, 0, 0, 255)
+                             for pixel in zip(*[iter(line)] * 4)])
+        eq_(expected, rows)
+
+
+def test_raster_colors():
+    qr = pyqrcode.create('COLORS')
+    raster = qr.raster(quiet_zone=1, mode='RGBA', module_color='#f00',
+                       background=None)
+    data = bytearray(raster.data)
+    # The border is the transparent inverse color, as in png()
+    eq_([0, 255, 255, 0], list(data[:4]))
+    eq_([255, 0, 0, 255], list(data[raster.stride + 4:raster.stride + 8]))
+
+
+def test_raster_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise nose.SkipTest('NumPy is not installed')
+    qr = pyqrcode.create('NUMPY')
+    raster = qr.raster(scale=2, quiet_zone=0, mode='L')
+    pixels = numpy.frombuffer(raster.data, numpy.uint8)
+    pixels = pixels.reshape(raster.height, raster.stride)
+    eq_(qr.code.tolist(), (pixels[::2, ::2] == 0).astype(int).tolist())
+
+
+@raises(ValueError)
+def test_raster_invalid_mode():
+    pyqrcode.create('test').raster(mode='CMYK')
+
+
+
+def test_raster_into():
+    qr = pyqrcode.create('INTO')
+    for mode, pixel_bytes in (('L', 1), ('RGB', 3), ('BGRA', 4)):
+        raster = qr.raster(2, 1, mode, module_color='#123456')
+        x, y, stride = 5, 3, (raster.width + 9) * pixel_bytes
+        buffer = bytearray(b'\x07') * (stride * (raster.height + 4))
+        eq_((raster.width, raster.height),
+            qr.raster_into(buffer, x, y, stride, mode, 2, 1, '#123456'))
+        for row in range(raster.height + 4):
+            line = buffer[row * stride:(row + 1) * stride]
+            expected = bytearray(b'\x07') * stride
+            if y <= row < y + raster.height:
+                start = x * pixel_bytes
+                expected[start:start + raster.stride] = \
+                    raster.data[(row - y) * raster.stride:
+                                (row - y + 1) * raster.stride]
+            eq_(expected, line)
+
+
+def test_raster_into_bits():
+    qr = pyqrcode.create('BITS')
+    raster = qr.raster(quiet_zone=0, mode='1')
+    # Not byte aligned, the bits around the code are kept
+    x, stride = 3, (raster.width + 3 + 7) // 8 + 1
+    buffer = bytearray(b'\xff') * (stride * raster.height)
+    qr.raster_into(buffer, x, 0, stride, '1', quiet_zone=0)
+    for row in range(raster.height):
+        line = buffer[row * stride:(row + 1) * stride]
+        bits = [(line[n // 8] >> (7 - n % 8)) & 1 for n in range(8 * stride)]
+        data = bytearray(raster.data[row * raster.stride:])
+        expected = [(data[n // 8] >> (7 - n % 8)) & 1
+                    for n in range(raster.width)]
+        eq_([1] * x + expected + [1] * (8 * stride - x - raster.width), bits)
+
+
+def test_raster_into_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise nose.SkipTest('NumPy is not installed')
+    qr = pyqrcode.create('NUMPY')
+    page = numpy.zeros((100, 120, 4), numpy.uint8)
+    width, height = qr.raster_into(page, 10, 20, scale=2, quiet_zone=1)
+    raster = qr.raster(2, 1, 'RGBA')
+    pixels = numpy.frombuffer(raster.data, numpy.uint8)
+    pixels = pixels.reshape(height, width, 4)
+    eq_(pixels.tolist(), page[20:20 + height, 10:10 + width].tolist())
+    eq_(0, page[:20].sum())
+
+
+@raises(ValueError)
+def test_raster_into_too_small():
+    qr = pyqrcode.create('test')
+    size = qr.get_png_size()
+    qr.raster_into(bytearray(size * size), x=1, stride=size, mode='L')
+
+
+@raises(ValueError)
+def test_raster_into_small_stride():
+    qr = pyqrcode.create('test')
+    size = qr.get_png_size()
+    qr.raster_into(bytearray(size * size * 4), stride=size * 4 - 1)
+
+
+@raises(ValueError)
+def test_raster_into_not_contiguous():
+    try:
+        import numpy
+    except ImportError:
+        raise nose.SkipTest('NumPy is not installed')
+    qr = pyqrcode.create('test')
+    page = numpy.zeros((100, 200, 4), numpy.uint8)
+    qr.raster_into(page[:, ::2])
+
+
+@raises(ValueError)
+def test_raster_into_fortran_order():
+    try:
+        import numpy
+    except ImportError:
+        raise nose.SkipTest('NumPy is not installed')
+    qr = pyqrcode.create('test')
+    page = numpy.zeros((100, 100), numpy.uint8, order='F')
+    qr.raster_into(page, mode='L')
+
+
+@raises(ValueError)
+def test_raster_into_readonly():
+    qr = pyqrcode.create('test')
+    qr.raster_into(bytes(100000), stride=1000)
+
+if __name__ == '__main__':
+    import nose
+    nose.core.runmodule()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""\
+Tests against the reedsolomon module.
+"""
+from __future__ import unicode_literals
+from nose.tools import eq_, ok_, raises
+from pyqrcode import reedsolomon
+import nose
+
+
+def test_error_block():
+    # 1-M "HELLO WORLD" example from the thonky.com tutorial
+    data = bytearray([32, 91, 11, 120, 209, 114, 220, 77, 67, 64, 236, 17,
+                      236, 17, 236, 17])
+    plan = reedsolomon.get_block_plan(1, 'M')
+    eq_([196, 35, 39, 119, 235, 215, 231, 226, 93, 23],
+        list(bytearray(plan.error_block(data))))
+
+
+def test_block_plan_is_cached():
+    ok_(reedsolomon.get_block_plan(40, 'H') is
+        reedsolomon.get_block_plan(40, 'H'))
+
+
+def test_block_plan_layout():
+    plan = reedsolomon.get_block_plan(5, 'Q')
+    eq_([15, 15, 16, 16], plan.block_sizes)
+    eq_(18, plan.ecc_words)
+    eq_(62, plan.data_words)
+    eq_(134, plan.total_words)
+
+
+def test_encode_interleaves():
+    plan = reedsolomon.get_block_plan(5, 'Q')
+    data = bytearray(range(plan.data_words))
+    blocks = plan.split(data)
+    words = plan.encode(data)
+    eq_(plan.total_words, len(words))
+    # Data: block 1 byte 1, block 2 byte 1, etc.
+    eq_([0, 15, 30, 46, 1, 16, 31, 47], list(words[:8]))
+    # The longer blocks carry the last data code words
+    eq_([45, 61], list(words[60:62]))
+    # Error blocks follow in the same order
+    eq_(bytearray(plan.error_block(blocks[2])[:1]), words[64:65])
+
+
+@raises(ValueError)
+def test_encode_wrong_length():
+    reedsolomon.get_block_plan(1, 'L').encode(b'\x00')
+
+
+def test_encode_many():
+    try:
+        import numpy
+    except ImportError:
+        raise nose.SkipTest()
+    for version, error in ((1, 'M'), (5, 'Q'), (40, 'H')):
+        plan = reedsolomon.get_block_plan(version, error)
+        data = numpy.arange(3 * plan.data_words, dtype=numpy.uint8)
+        data = data.reshape(3, plan.data_words)
+        words = plan.encode_many(data)
+        eq_((3, plan.total_words), words.shape)
+        for row, expected in zip(data, words):
+            eq_(plan.encode(bytearray(row.tobytes())),
+                bytearray(expected.tobytes()))
+
+
+def test_gf_multiply():
+    eq_(0, reedsolomon.gf_multiply(0, 7))
+    eq_(1, reedsolomon.gf_multiply(1, 1))
+    # x^7 * x == x^8 == x^4 + x^3 + x^2 + 1
+    eq_(29, reedsolomon.gf_multiply(128, 2))
+
+
+if __name__ == '__main__':
+    import nose
+    nose.core.runmodule()